@@ -0,0 +1,251 @@
+"""Throughput benchmarks for the Briscola engine and environments.
+
+Usage:
+    python benchmarks/run_benchmarks.py [--output results.json]
+    python benchmarks/run_benchmarks.py --compare baseline.json [--tolerance 0.1]
+
+Every benchmark is run for 2 and 4 players. Results are printed and written
+as JSON; with --compare the run is checked against a saved baseline and the
+script exits with status 1 if any metric regressed by more than --tolerance.
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+
+import numpy as np
+
+from briscola_gym.envs.briscola_game import Game
+from briscola_gym.envs.briscola_env import BriscolaEnv
+from briscola_gym.envs.briscola_vec_env import BriscolaVecEnv
+from briscola_gym.envs.briscola_multiagent import BriscolaMultiAgentVecEnv
+from briscola_gym.envs.briscola_vec_game import simulate_games
+
+BENCHMARKS = {}
+
+
+def benchmark(name, unit, higher_is_better):
+    def register(func):
+        BENCHMARKS[name] = (func, unit, higher_is_better)
+        return func
+    return register
+
+
+def _measure(func, min_time, repeat):
+    """Return the best ops/s over `repeat` runs of at least `min_time` s.
+
+    `func(n)` must run `n` operations and return how many it actually ran.
+    """
+    n = 1
+    while True:
+        start = time.perf_counter()
+        ops = func(n)
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time / 10:
+            break
+        n *= 10
+    n = max(1, int(n * min_time / max(elapsed, 1e-9)))
+    best = 0.
+    for _ in range(repeat):
+        start = time.perf_counter()
+        ops = func(n)
+        best = max(best, ops / (time.perf_counter() - start))
+    return best
+
+
+@benchmark('random_playout', 'games/s', True)
+def bench_random_playout(num_players, min_time, repeat):
+    game = Game(num_players=num_players, init_game=False, seed=0)
+
+    def run(n):
+        for _ in range(n):
+            game.reset()
+            game.init_game()
+            game.simulate_random_game(verbose=0)
+        return n
+    return _measure(run, min_time, repeat)
+
+
+@benchmark('simulate_games', 'games/s', True)
+def bench_simulate_games(num_players, min_time, repeat, chunk_size=4096):
+    def run(n):
+        simulate_games(n * chunk_size, num_players=num_players, seed=0,
+                       chunk_size=chunk_size)
+        return n * chunk_size
+    return _measure(run, min_time, repeat)
+
+
+@benchmark('env_step', 'steps/s', True)
+def bench_env_step(num_players, min_time, repeat):
+    env = BriscolaEnv(num_players=num_players)
+    env.reset(seed=0)
+    actions = np.random.default_rng(0).integers(0, 3, 4096).tolist()
+
+    def run(n):
+        for i in range(n):
+            _, _, done, _ = env.step(actions[i % 4096])
+            if done:
+                env.reset()
+        return n
+    return _measure(run, min_time, repeat)
+
+
+@benchmark('vec_env_step', 'steps/s', True)
+def bench_vec_env_step(num_players, min_time, repeat, num_envs=1024):
+    env = BriscolaVecEnv(num_envs, num_players=num_players, seed=0)
+    env.reset()
+    actions = np.random.default_rng(0).integers(0, 3, (64, num_envs))
+
+    def run(n):
+        for i in range(n):
+            env.step(actions[i % 64])
+        return n * num_envs
+    return _measure(run, min_time, repeat)
+
+
+@benchmark('team_vec_env_step', 'steps/s', True)
+def bench_team_vec_env_step(num_players, min_time, repeat, num_envs=1024):
+    # Multi-agent batch with partner-aware observations, every game lasting
+    # NUM_CARDS steps whatever the number of players
+    env = BriscolaMultiAgentVecEnv(num_envs, num_players=num_players, seed=0,
+                                   observation_mode='team')
+    env.reset()
+    actions = np.random.default_rng(0).integers(0, 3, (64, num_envs))
+
+    def run(n):
+        for i in range(n):
+            env.step(actions[i % 64])
+        return n * num_envs
+    return _measure(run, min_time, repeat)
+
+
+@benchmark('env_reset', 'us', False)
+def bench_env_reset(num_players, min_time, repeat):
+    env = BriscolaEnv(num_players=num_players)
+    env.reset(seed=0)
+
+    def run(n):
+        for _ in range(n):
+            env.reset()
+        return n
+    return 1e6 / _measure(run, min_time, repeat)
+
+
+@benchmark('observation_build', 'us', False)
+def bench_observation_build(num_players, min_time, repeat):
+    env = BriscolaEnv(num_players=num_players)
+    env.reset(seed=0)
+    for _ in range(num_players + 1):
+        env.step(0)
+
+    def run(n):
+        for _ in range(n):
+            env._next_observation()
+        return n
+    return 1e6 / _measure(run, min_time, repeat)
+
+
+@benchmark('clone', 'us', False)
+def bench_clone(num_players, min_time, repeat):
+    game = Game(num_players=num_players, seed=0)
+    for _ in range(3):
+        game.step()
+
+    def run(n):
+        for _ in range(n):
+            game.clone()
+        return n
+    return 1e6 / _measure(run, min_time, repeat)
+
+
+@benchmark('worker_cold_start', 'ms', False)
+def bench_worker_cold_start(num_players, min_time, repeat):
+    # A fresh interpreter importing the rules engine and playing one game, as
+    # a spawned worker would; fails if the engine pulls in gym or numpy
+    code = ('import sys; from briscola_gym.envs.briscola_game import Game; '
+            'Game(num_players={}, seed=0).simulate_random_game(verbose=0); '
+            'assert not {{"gym", "numpy"}} & set(sys.modules), "engine imports gym or numpy"'
+            ).format(num_players)
+
+    def run(n):
+        for _ in range(n):
+            subprocess.run([sys.executable, '-c', code], cwd=ROOT, check=True)
+        return n
+    return 1e3 / _measure(run, min_time, repeat)
+
+
+def run_benchmarks(names=None, players=(2, 4), min_time=0.2, repeat=3):
+    results = {}
+    for name, (func, unit, higher_is_better) in BENCHMARKS.items():
+        if names and name not in names:
+            continue
+        for num_players in players:
+            key = '{}[players={}]'.format(name, num_players)
+            value = func(num_players, min_time, repeat)
+            results[key] = {'value': value, 'unit': unit,
+                            'higher_is_better': higher_is_better}
+            print('{:<36} {:>14.2f} {}'.format(key, value, unit))
+    return {
+        'meta': {
+            'date': datetime.datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+        },
+        'results': results,
+    }
+
+
+def compare(current, baseline, tolerance):
+    """Print the change of every metric and return the regressed ones."""
+    regressions = []
+    for key, result in current['results'].items():
+        if key not in baseline['results']:
+            continue
+        old = baseline['results'][key]['value']
+        new = result['value']
+        if result['higher_is_better']:
+            change = new / old - 1
+        else:
+            change = old / new - 1
+        status = ''
+        if change < -tolerance:
+            status = 'REGRESSION'
+            regressions.append(key)
+        print('{:<36} {:>+8.1%} {}'.format(key, change, status))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--output', help='write the results to this JSON file')
+    parser.add_argument('--compare', help='baseline JSON file to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.1,
+                        help='allowed relative slowdown before failing (default: 0.1)')
+    parser.add_argument('--players', type=int, nargs='+', default=[2, 4])
+    parser.add_argument('--min-time', type=float, default=0.2,
+                        help='minimum duration of a single measurement in seconds')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('benchmarks', nargs='*', help='run only these benchmarks')
+    args = parser.parse_args(argv)
+    current = run_benchmarks(args.benchmarks, args.players, args.min_time, args.repeat)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(current, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if compare(current, baseline, args.tolerance):
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
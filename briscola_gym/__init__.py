@@ -1,6 +1,22 @@
-from gym.envs.registration import register
+import sys
 
-register(
-    id='briscola-v0',
-    entry_point='briscola_gym.envs:BriscolaEnv',
-)
+
+def register_envs():
+    """Register the Briscola environments in the gym registry."""
+    from gym.envs.registration import register, registry
+    # Older gym versions keep the specs of an EnvRegistry in env_specs
+    specs = getattr(registry, 'env_specs', registry)
+    if 'briscola-v0' not in specs:
+        register(
+            id='briscola-v0',
+            entry_point='briscola_gym.envs:BriscolaEnv',
+        )
+
+
+# Importing gym is slow, so the rules engine can be used without it: register
+# right away only if gym is already loaded. Otherwise gym.make('briscola_gym:
+# briscola-v0') imports this package first, installed packages are registered
+# by gym through the 'gym.envs' entry point, and accessing an environment
+# class registers them too.
+if sys.modules.get('gym') is not None:
+    register_envs()
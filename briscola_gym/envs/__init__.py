@@ -1,2 +1,51 @@
-from briscola_gym.envs.briscola_env import BriscolaEnv
+import importlib
+import sys
+
 from briscola_gym.envs.briscola_game import *
+
+# The environments and the batched engine depend on gym and numpy: they are
+# imported on first access, so that the rules engine alone loads fast.
+_LAZY_EXPORTS = {
+    'BriscolaEnv': 'briscola_env',
+    'BriscolaVecEnv': 'briscola_vec_env',
+    'VecGame': 'briscola_vec_game',
+    'simulate_games': 'briscola_vec_game',
+    'iter_simulate_games': 'briscola_vec_game',
+    'replay_games': 'briscola_vec_game',
+    'ParallelBriscolaEnv': 'briscola_parallel_env',
+    'ISMCTSPlayer': 'briscola_mcts',
+    'EndgameSolver': 'briscola_endgame',
+    'EndgamePlayer': 'briscola_endgame',
+    'unpack_bitboards': 'briscola_bitboard',
+    'BriscolaAECEnv': 'briscola_multiagent',
+    'BriscolaMultiAgentVecEnv': 'briscola_multiagent',
+    'TrajectoryWriter': 'briscola_trajectory',
+    'TrajectoryRecorder': 'briscola_trajectory',
+    'TrajectoryReader': 'briscola_trajectory',
+    'PhaseStats': 'briscola_profiling',
+    'profile': 'briscola_profiling',
+    'RandomPolicy': 'briscola_tournament',
+    'RatingTable': 'briscola_tournament',
+    'play_match': 'briscola_tournament',
+    'iter_round_robin': 'briscola_tournament',
+    'round_robin': 'briscola_tournament',
+    'OpponentLeague': 'briscola_league',
+    'LeagueVecEnv': 'briscola_league',
+    'PositionCache': 'briscola_cache',
+}
+
+
+def __getattr__(name):
+    if name not in _LAZY_EXPORTS:
+        raise AttributeError('module {!r} has no attribute {!r}'.format(__name__, name))
+    module = importlib.import_module('briscola_gym.envs.' + _LAZY_EXPORTS[name])
+    if sys.modules.get('gym') is not None:
+        import briscola_gym
+        briscola_gym.register_envs()
+    value = getattr(module, name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY_EXPORTS))
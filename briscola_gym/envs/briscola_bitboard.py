@@ -0,0 +1,30 @@
+import numpy as np
+
+from briscola_gym.envs.briscola_game import NUM_CARDS, CARD_IDS, CARD_SUIT, seed_dict
+
+# Card id `c` is bit `c - 1` of a 40-bit board, the NaC token has no bit.
+CARD_BIT = (0,) + tuple(1 << (card_id - 1) for card_id in CARD_IDS)
+SUIT_MASK = tuple(sum(CARD_BIT[card_id] for card_id in CARD_IDS if CARD_SUIT[card_id] == suit)
+                  for suit in range(len(seed_dict)))
+
+# Bitboard observation: the planes below stored as little-endian uint64,
+# followed by the deck size and the current player, all as uint8.
+PLANES = ('hand', 'seen', 'trick', 'briscola')
+PLANE_BYTES = 8
+BITBOARD_OBS_SIZE = len(PLANES) * PLANE_BYTES + 2
+
+
+def cards_mask(card_ids):
+    mask = 0
+    for card_id in card_ids:
+        mask |= CARD_BIT[card_id]
+    return mask
+
+
+def unpack_bitboards(obs):
+    """Unpack bitboard observations of shape (..., BITBOARD_OBS_SIZE) into
+    (..., len(PLANES), NUM_CARDS) one-hot planes, card id `c` at index `c - 1`."""
+    obs = np.asarray(obs, dtype=np.uint8)
+    planes = obs[..., :len(PLANES) * PLANE_BYTES].reshape(
+        obs.shape[:-1] + (len(PLANES), PLANE_BYTES))
+    return np.unpackbits(planes, axis=-1, bitorder='little')[..., :NUM_CARDS]
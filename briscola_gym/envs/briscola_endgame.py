@@ -0,0 +1,157 @@
+from briscola_gym.envs.briscola_cache import PositionCache
+from briscola_gym.envs.briscola_game import NUM_CARDS, CARD_SCORE, TRICK_WINNER
+from briscola_gym.envs.briscola_mcts import ISMCTSPlayer
+
+_EXACT, _LOWER, _UPPER = 0, 1, 2
+
+
+def _cards(mask):
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+class EndgameSolver(object):
+    """Exact alpha-beta solver for positions where the deck is empty.
+
+    With two players the last cards of both sides are known by elimination,
+    so the position is of perfect information. Hands are encoded as bitmasks
+    of card ids and the transposition table maps (briscola suit, hands,
+    field, leader) to the margin of the points still to be won, so entries
+    are shared across positions that differ only by the score. The table is a
+    `PositionCache` holding at most `max_entries` entries, the least recently
+    used ones being evicted first.
+    """
+    def __init__(self, max_entries=1 << 16):
+        super(EndgameSolver, self).__init__()
+        self._cache = PositionCache(max_entries)
+        self._suit = -1
+        self._trick_winner = None
+        self._num_players = 0
+
+    @property
+    def cache(self):
+        return self._cache
+
+    def clear(self):
+        self._cache.clear()
+
+    def _value(self, hands, field, leader, alpha, beta):
+        # Margin of the remaining points for team 0
+        num_players = self._num_players
+        to_move = (leader + len(field)) % num_players
+        if not hands[to_move]:
+            return 0
+        key = (self._suit, hands, field, leader)
+        entry = self._cache.get(key)
+        if entry is not None:
+            value, flag = entry
+            if flag == _EXACT:
+                return value
+            elif flag == _LOWER:
+                alpha = max(alpha, value)
+            else:
+                beta = min(beta, value)
+            if alpha >= beta:
+                return value
+        alpha_orig, beta_orig = alpha, beta
+        maximize = to_move % 2 == 0
+        best = -NUM_CARDS * 11 if maximize else NUM_CARDS * 11
+        for card in _cards(hands[to_move]):
+            child_hands = hands[:to_move] + (hands[to_move] ^ (1 << card),) + hands[to_move + 1:]
+            child_field = field + (card,)
+            if len(child_field) < num_players:
+                value = self._value(child_hands, child_field, leader, alpha, beta)
+            else:
+                winner, points = self._resolve(child_field, leader)
+                if winner % 2 != 0:
+                    points = -points
+                value = points + self._value(child_hands, (), winner,
+                                             alpha - points, beta - points)
+            if maximize:
+                best = max(best, value)
+                alpha = max(alpha, best)
+            else:
+                best = min(best, value)
+                beta = min(beta, best)
+            if alpha >= beta:
+                break
+        if best <= alpha_orig:
+            flag = _UPPER
+        elif best >= beta_orig:
+            flag = _LOWER
+        else:
+            flag = _EXACT
+        self._cache.put(key, (best, flag))
+        return best
+
+    def _resolve(self, field, leader):
+        trick_winner = self._trick_winner
+        winner_card = field[0]
+        winner_offset = 0
+        points = CARD_SCORE[winner_card]
+        for i in range(1, len(field)):
+            card = field[i]
+            points += CARD_SCORE[card]
+            if trick_winner[winner_card * (NUM_CARDS + 1) + card]:
+                winner_card = card
+                winner_offset = i
+        return (leader + winner_offset) % len(field), points
+
+    def solve(self, game):
+        """Return the best card id for the player to move in `game` and the
+        final score margin of its team under optimal play by all players."""
+        assert len(game.deck) == 0, 'The endgame starts when the deck is empty.'
+        self._num_players = game.num_players
+        self._suit = suit = game.deck.briscola_suit
+        self._trick_winner = TRICK_WINNER[suit]
+        hands = tuple(sum(1 << card for card in player.hand.card_ids)
+                      for player in game.players)
+        field = tuple(card for card, _, _ in game.field.get_cards_and_ids())
+        leader = game.last_winner_id
+        to_move = (leader + len(field)) % self._num_players
+        score = game.teams_score[0] - game.teams_score[1]
+        sign = 1 if to_move % 2 == 0 else -1
+        if not hands[to_move]:
+            return None, sign * score
+        best_card, best_value = None, None
+        for card in _cards(hands[to_move]):
+            child_hands = hands[:to_move] + (hands[to_move] ^ (1 << card),) + hands[to_move + 1:]
+            child_field = field + (card,)
+            if len(child_field) < self._num_players:
+                value = self._value(child_hands, child_field, leader,
+                                    -NUM_CARDS * 11, NUM_CARDS * 11)
+            else:
+                winner, points = self._resolve(child_field, leader)
+                if winner % 2 != 0:
+                    points = -points
+                value = points + self._value(child_hands, (), winner,
+                                             -NUM_CARDS * 11, NUM_CARDS * 11)
+            value *= sign
+            if best_value is None or value > best_value:
+                best_card, best_value = card, value
+        return best_card, sign * score + best_value
+
+    def value(self, game, team_id=0):
+        """Final score margin of `team_id` under optimal play."""
+        _, margin = self.solve(game)
+        to_move = (game.last_winner_id + len(game.field.get_cards_and_ids())) % game.num_players
+        return margin if to_move % 2 == team_id else -margin
+
+
+class EndgamePlayer(object):
+    """Opponent playing the solver move once the deck is empty and deferring
+    to `fallback` (an ISMCTS player by default) before that. With more than
+    two players the hands of the other players stay hidden until the end, so
+    the solver, which reads them, is only used in two players games."""
+    def __init__(self, fallback=None, solver=None):
+        super(EndgamePlayer, self).__init__()
+        self.fallback = fallback if fallback is not None else ISMCTSPlayer()
+        self.solver = solver if solver is not None else EndgameSolver()
+
+    def __call__(self, game, player_id):
+        if len(game.deck) > 0 or game.num_players != 2:
+            return self.fallback(game, player_id)
+        card, _ = self.solver.solve(game)
+        return game.players[player_id].hand.card_ids.index(card)
@@ -4,7 +4,11 @@ from gym.utils import seeding
 import briscola_gym.envs.briscola_game
 
 import random
-from briscola_gym.envs.briscola_game import Game
+from briscola_gym.envs.briscola_game import Game, NUM_CARDS, HAND_SIZE, hand_slot
+from briscola_gym.envs.briscola_endgame import EndgameSolver
+from briscola_gym.envs.briscola_bitboard import (
+    CARD_BIT, SUIT_MASK, BITBOARD_OBS_SIZE, cards_mask)
+from briscola_gym.envs.briscola_profiling import PhaseStats, instrument, uninstrument, print_event
 
 import numpy as np
 
@@ -12,95 +16,332 @@ import numpy as np
 
 
 class BriscolaEnv(gym.Env):
-    """Custom Environment that follows gym interface"""
-    metadata = {'render.modes': ['human']}
+    """Custom Environment that follows gym interface
 
-    def __init__(self, num_players=2, init_game=False):
+    Observations are written in place into a preallocated buffer, the array
+    returned by `reset` and `step` is overwritten by the following call.
+    Pass `out=` to have the observation copied into a caller-owned array.
+
+    If an `opponent` policy is given, the seats other than `player_id` are
+    played by it inside `step`, called as `opponent(game, seat)` and returning
+    a hand index. Rewards of the opponent moves are added to the step reward.
+
+    `info_mode` selects the step info: 'dict' (default) gives the card ids
+    played in the current trick under 'cards' and, when the move resolved
+    the trick, its winner seat and points under 'trick_winner' and 'points'
+    (-1 and 0 otherwise); 'none' gives an empty dict; 'text' gives the legacy
+    field string, else available on demand through `field_text()` and
+    `render()`.
+
+    With `oracle=True`, once the deck is empty `info` holds under
+    'oracle_value' the exact final score margin of the `player_id` team
+    under optimal play. In 'text' info mode `info` then becomes a dict with
+    the text under 'text'.
+
+    With `action_mask=True` observations are dicts holding the array above
+    under 'observation' and, under 'action_mask', which hand slots of the
+    current player hold a card. Once all cards are played only slot 0 is
+    set: any action then ends the game. The mask is also available through
+    `action_mask()` in both modes.
+
+    `observation_mode='bitboard'` replaces the card ids with 40-bit boards of
+    the current player hand, the cards seen (played or face-up briscola), the
+    current trick and the briscola suit, packed as uint64 into a uint8 array
+    followed by deck size and current player; see `unpack_bitboards`.
+    `action_mode='card'` makes actions card ids minus one (Discrete(40)) and
+    the action mask covers the 40 cards; a card not in hand plays slot 0.
+
+    `observation_mode='seat'` hides the other hands: the observation holds
+    the current player hand, briscola, field, deck size and current player
+    (same order as above) followed by 40 flags of the cards played so far.
+    With `critic=True` the full observation, with every hand, is returned as
+    `info['critic_observation']` (and by `critic_observation()`); both views
+    come from the same incrementally updated buffer.
+
+    `on_event`, a callable `handler(event, data)`, receives the 'step',
+    'trick' and 'observation' events; with `verbose` set and no handler they
+    are printed by `print_event`. `enable_profiling()` times the step phases,
+    read back with `stats()`, see also `briscola_profiling.profile`.
+    """
+    metadata = {'render.modes': ['human', 'ansi']}
+    # Methods timed by enable_profiling, and their phase names
+    _PROFILED_PHASES = {
+        'step': 'step',
+        'reset': 'reset',
+        '_take_action': 'take_action',
+        '_draw_observation': 'draw_observation',
+        '_next_observation': 'next_observation',
+        'field_text': 'field_text',
+        '_output': 'output',
+        '_play_opponents': 'play_opponents',
+    }
+
+    def __init__(self, num_players=2, init_game=False, opponent=None, player_id=0,
+                 oracle=False, action_mask=False, observation_mode='ids',
+                 action_mode='slot', critic=False, on_event=None, info_mode='dict'):
         super(BriscolaEnv, self).__init__()
-        self.game = Game(num_players=num_players, init_game=init_game)
+        # numpy shuffles the deck faster than the engine default generator
+        self.game = Game(num_players=num_players, init_game=init_game,
+                         seed=np.random.default_rng())
         if init_game:
             self.game_initialized = True
         else:
             self.game_initialized = False
         # Define action and observation space
         # They must be gym.spaces objects
-        self.action_space = spaces.Discrete(3)
+        assert observation_mode in ('ids', 'bitboard', 'seat')
+        assert action_mode in ('slot', 'card')
+        assert info_mode in ('dict', 'none', 'text')
+        self.info_mode = info_mode
+        self.observation_mode = observation_mode
+        self.action_mode = action_mode
+        if action_mode == 'card':
+            self.action_space = spaces.Discrete(NUM_CARDS)
+        else:
+            self.action_space = spaces.Discrete(HAND_SIZE)
         self.num_players = num_players
-        self.player_id = 0
+        self.player_id = player_id
+        self._seat_team = [player.team_id for player in self.game.players]
+        self.opponent = opponent
+        # Positions rarely repeat across games: a small table covers a solve
+        self.oracle = EndgameSolver(max_entries=1 << 12) if oracle else None
+        self.critic = critic
+        self.on_event = on_event
+        self._stats = None
         self.num_played_cards = 0
         self.current_player = 0
         self.turn_cnt = 0
         # Example for using image as input:
-        self.obs_shape = 3 * self.num_players + self.num_players + 3 + 1
-        self.observation_space = spaces.Box(low=-np.ones((self.obs_shape,)),
-                                            high=np.array([41] * self.obs_shape,), dtype=np.float16)
+        self.obs_shape = HAND_SIZE * self.num_players + 1 + self.num_players + 2
+        self.observation_space = spaces.Box(low=0, high=NUM_CARDS,
+                                            shape=(self.obs_shape,), dtype=np.int8)
+        self._field_offset = HAND_SIZE * self.num_players + 1
+        self._obs = np.zeros((self.obs_shape,), dtype=self.observation_space.dtype)
+        if observation_mode == 'bitboard':
+            self.observation_space = spaces.Box(low=0, high=255,
+                                                shape=(BITBOARD_OBS_SIZE,), dtype=np.uint8)
+            self._bitboard = np.zeros((BITBOARD_OBS_SIZE,), dtype=np.uint8)
+            self._planes = self._bitboard[:-2].view('<u8')
+        elif observation_mode == 'seat':
+            # Public part of the full observation: briscola, field, deck size, current player
+            self._public_size = self.obs_shape - self._field_offset + 1
+            self._played_offset = HAND_SIZE + self._public_size
+            seat_shape = (self._played_offset + NUM_CARDS,)
+            self.observation_space = spaces.Box(low=0, high=NUM_CARDS,
+                                                shape=seat_shape, dtype=np.int8)
+            self._seat_obs = np.zeros(seat_shape, dtype=np.int8)
+        self._action_mask = np.zeros((self.action_space.n,), dtype=np.int8)
+        self._use_action_mask = action_mask
+        if action_mask:
+            self.observation_space = spaces.Dict({
+                'observation': self.observation_space,
+                'action_mask': spaces.MultiBinary(self.action_space.n),
+            })
         # HEIGHT, WIDTH, N_CHANNELS = 1, 1, 1
         # self.observation_space = spaces.Box(low=0, high=255, shape=
         #                                 (HEIGHT, WIDTH, N_CHANNELS), dtype=np.uint8)
+        self._next_observation()
 
-    def _next_observation(self, verbose=0):
-        # Observations are custom objects:
-        # Fields: (cards in hands, ..., briscola, field cards, ..., deck size, current player, winner player)
-        hand_card_embeddings = np.zeros((self.num_players * 3,))
+    @property
+    def on_event(self):
+        return self._on_event
 
+    @on_event.setter
+    def on_event(self, handler):
+        self._on_event = handler
+        self.game.on_event = handler
+
+    def _event_handler(self, verbose):
+        if self._on_event is not None:
+            return self._on_event
+        return print_event if verbose else None
+
+    def enable_profiling(self, stats=None):
+        """Start timing the env and game phases into `stats` (a new
+        `PhaseStats` by default) and return it."""
+        self._stats = stats if stats is not None else PhaseStats()
+        instrument(self, self._PROFILED_PHASES, self._stats)
+        self.game.enable_profiling(self._stats)
+        return self._stats
+
+    def disable_profiling(self):
+        uninstrument(self, self._PROFILED_PHASES)
+        self.game.disable_profiling()
+
+    def stats(self):
+        """Calls and cumulative time_ns of every profiled phase."""
+        if self._stats is None:
+            return {}
+        return self._stats.as_dict()
+
+    def _next_observation(self, verbose=0, out=None):
+        # Observations are custom objects:
+        # Fields: (cards in hands, ..., briscola, field cards, ..., deck size, current player)
+        # Rebuilds the whole observation, step() only updates what changed.
+        obs = self._obs if out is None else out
+        obs[:] = 0
         for i, player in enumerate(self.game.players):
-            hand = player.hand
-            if hand.size > 0:
-                hand_cards_id = []
-                for j, card in enumerate(hand.cards):
-                    hand_card_embeddings[i * 3 + j] = card.card_id
-                if verbose >= 1:
-                    print('Player {} hand cards: {}'.format(
-                        i, hand_card_embeddings[i*3:(i+1)*3]))
-
-        field_card_embeddings = np.zeros((1 + self.num_players,))
-        if self.game.deck.briscola_ref is not None:
-            field_card_embeddings[0] = self.game.deck.briscola_ref.card_id
-        field_cards = self.game.field.get_cards_and_ids()
-        for card, player_id, team_id in field_cards:
-            field_card_embeddings[player_id + 1] = card.card_id
-        if verbose >= 1:
-            print('Field_cards: ', field_card_embeddings[1:])
-
-        # obs = np.concatenate((hand_card_embeddings, field_card_embeddings, np.array([len(self.game.deck)])))
-        # obs = np.append(obs, [self.current_player, -1], axis=0)
-
-        obs = np.concatenate([
-            hand_card_embeddings,
-            field_card_embeddings,
-            np.array([len(self.game.deck), self.current_player]),
-        ])
-
-        return obs.astype(int)
-
-    def reset(self):
+            for j, card_id in enumerate(player.hand.card_ids):
+                obs[i * HAND_SIZE + j] = card_id
+        obs[self._field_offset - 1] = self.game.deck.briscola_ref_id
+        for card_id, player_id, team_id in self.game.field.get_cards_and_ids():
+            obs[self._field_offset + player_id] = card_id
+        obs[-2] = len(self.game.deck)
+        obs[-1] = self.current_player
+        handler = self._event_handler(verbose)
+        if handler is not None:
+            handler('observation', {'observation': obs})
+        return obs
+
+    def action_mask(self):
+        """Return which actions select a card of the current player."""
+        mask = self._action_mask
+        card_ids = self.game.players[self.current_player].hand.card_ids
+        if self.action_mode == 'card':
+            mask[:] = 0
+            for card_id in card_ids:
+                mask[card_id - 1] = 1
+            if not card_ids and self.game.players_hand_size() == 0:
+                mask[0] = 1
+            return mask
+        size = len(card_ids)
+        if size == 0 and self.game.players_hand_size() == 0:
+            size = 1
+        for j in range(HAND_SIZE):
+            mask[j] = j < size
+        return mask
+
+    def _bitboard_observation(self):
+        planes = self._planes
+        deck = self.game.deck
+        planes[0] = cards_mask(self.game.players[self.current_player].hand.card_ids)
+        planes[1] = self.game.played_mask | CARD_BIT[deck.briscola_ref_id]
+        trick = 0
+        for card_id, _, _ in self.game.field.get_cards_and_ids():
+            trick |= CARD_BIT[card_id]
+        planes[2] = trick
+        planes[3] = SUIT_MASK[deck.briscola_suit] if deck.briscola_suit >= 0 else 0
+        self._bitboard[-2] = len(deck)
+        self._bitboard[-1] = self.current_player
+        return self._bitboard
+
+    def _seat_observation(self):
+        seat = self._seat_obs
+        obs = self._obs
+        base = self.current_player * HAND_SIZE
+        seat[:HAND_SIZE] = obs[base:base + HAND_SIZE]
+        seat[HAND_SIZE:self._played_offset] = obs[self._field_offset - 1:]
+        return seat
+
+    def critic_observation(self):
+        """Privileged observation with every hand, for centralized critics."""
+        return self._obs
+
+    def _output(self, out):
+        if self.observation_mode == 'bitboard':
+            src = self._bitboard_observation()
+        elif self.observation_mode == 'seat':
+            src = self._seat_observation()
+        else:
+            src = self._obs
+        if out is None:
+            obs = src
+        else:
+            out[:] = src
+            obs = out
+        if self._use_action_mask:
+            return {'observation': obs, 'action_mask': self.action_mask()}
+        return obs
+
+    def seed(self, seed=None):
+        self.game.seed(np.random.default_rng(seed))
+        return [seed]
+
+    def reset(self, seed=None, out=None):
+        if seed is not None:
+            self.seed(seed)
         self.game.reset()
         self.game.init_game()
         self.game_initialized = True
         self.num_played_cards = 0
+        if self.observation_mode == 'seat':
+            self._seat_obs[self._played_offset:] = 0
         # if not self.game_initialized:
         self.current_player = 0
-        return self._next_observation()
+        self._next_observation()
+        if self.opponent is not None:
+            self._play_opponents()
+        return self._output(out)
 
     def _take_action(self, player_id, action):
-        def get_card_id_from(a):
-            if a < 1:
-                card_id = 0
-            elif a < 2:
-                card_id = 1
-            else:
-                card_id = 2
-            return card_id
-        self.game.player_play_card(player_id, get_card_id_from(action))
+        hand = self.game.players[player_id].hand
+        index = hand_slot(action, hand.size)
+        card_id = hand.card_ids[index]
+        self.game.player_play_card(player_id, index)
         self.num_played_cards += 1
+        if self.observation_mode == 'seat':
+            self._seat_obs[self._played_offset + card_id - 1] = 1
+        # Shift the following hand cards left and put the card on the field
+        obs = self._obs
+        base = player_id * HAND_SIZE
+        for j in range(base + index, base + HAND_SIZE - 1):
+            obs[j] = obs[j + 1]
+        obs[base + HAND_SIZE - 1] = 0
+        obs[self._field_offset + player_id] = card_id
 
-    def step(self, action, verbose=0):
+    def _draw_observation(self):
+        # Every player drew one card, appended at the end of the hand
+        obs = self._obs
+        for i, player in enumerate(self.game.players):
+            hand = player.hand
+            obs[i * HAND_SIZE + hand.size - 1] = hand.card_ids[-1]
+        obs[-2] = len(self.game.deck)
+
+    def field_text(self):
+        """Text description of the cards on the field."""
+        return str(self.game.field)
+
+    def _card_to_slot(self, action):
+        card_ids = self.game.players[self.current_player].hand.card_ids
+        card_id = int(action) + 1
+        if card_id in card_ids:
+            return card_ids.index(card_id)
+        return 0
+
+    def _play_opponents(self, verbose=0):
+        reward = np.zeros((self.num_players,))
+        info = None
+        while self.game.players_hand_size() > 0 and self.current_player != self.player_id:
+            action = self.opponent(self.game, self.current_player)
+            opponent_reward, _, info = self._step(action, verbose)
+            reward += opponent_reward
+        return reward, info
+
+    def step(self, action, verbose=0, out=None):
         '''
         Return 
         '''
-        if verbose > 0:
-            print('-' * 80)
-        resolve = False
+        if self.action_mode == 'card':
+            action = self._card_to_slot(action)
+        reward, done, info = self._step(action, verbose)
+        if self.opponent is not None and not done:
+            opponent_reward, opponent_info = self._play_opponents(verbose)
+            reward += opponent_reward
+            if opponent_info is not None:
+                info = opponent_info
+        oracle = self.oracle is not None and len(self.game.deck) == 0
+        if oracle or self.critic:
+            if self.info_mode == 'text':
+                info = {'text': info}
+            if oracle:
+                info['oracle_value'] = self.oracle.value(
+                    self.game, self.game.players[self.player_id].team_id)
+            if self.critic:
+                info['critic_observation'] = self._obs
+        return self._output(out), reward, done, info
+
+    def _step(self, action, verbose=0):
+        player_id = self.current_player
         # reward, done, info can't be included
         reward = np.zeros((self.num_players,))
         if self.game.players_hand_size() > 0:
@@ -111,14 +352,24 @@ class BriscolaEnv(gym.Env):
             # Update the playing player and resolve if all players played
             self.current_player = (
                 self.current_player + 1) % self.game.num_players
-            info = str(self.game.field)
+            info_mode = self.info_mode
+            if info_mode == 'dict':
+                info = {'cards': [card_id for card_id, _, _ in self.game.field.get_cards_and_ids()],
+                        'trick_winner': -1, 'points': 0}
+            elif info_mode == 'text':
+                info = self.field_text()
+            else:
+                info = {}
             # Resolve if all players played a card
             if self.num_played_cards == self.num_players:
                 field_score = self.game.field.get_score()
                 team_scores = self.game.field.get_teams_scores()
-                winner_player_id, winning_team_id = self.game.resolve_step(
-                    verbose=0)
-                observation = self._next_observation()  # We draw the cards in resolve_step
+                draw = len(self.game.deck) > 0
+                winner_player_id, winning_team_id = self.game.resolve_step(verbose)
+                # We draw the cards in resolve_step
+                self._obs[self._field_offset:-2] = 0
+                if draw:
+                    self._draw_observation()
 
                 winners_reward, losers_reward = field_score, 0  # -field_score
                 # def reward_function():
@@ -145,28 +396,22 @@ class BriscolaEnv(gym.Env):
                 #     return winners_reward, losers_reward
                 # winners_reward, losers_reward = reward_function()
 
-                for i in range(self.num_players):
-                    if i % 2 == winning_team_id:  # There are max two players per team
-                        reward[i] = winners_reward
-                    else:
-                        reward[i] = losers_reward
+                for i, team_id in enumerate(self._seat_team):
+                    reward[i] = winners_reward if team_id == winning_team_id else losers_reward
                 self.num_played_cards = 0
                 self.current_player = winner_player_id
-                observation[-1] = winner_player_id
-                resolve = True
-            else:
-                observation = self._next_observation()
+                if info_mode == 'dict':
+                    info['trick_winner'] = winner_player_id
+                    info['points'] = field_score
+            self._obs[-1] = self.current_player
         else:
             done = True
 
             field_score = self.game.field.get_score()
             winners_reward, losers_reward = field_score, 0  # -field_score
             winning_team_id, winning_score = self.game.get_winner_team()
-            for i in range(self.num_players):
-                if i % 2 == winning_team_id:  # There are max two players per team
-                    reward[i] = winners_reward
-                else:
-                    reward[i] = losers_reward
+            for i, team_id in enumerate(self._seat_team):
+                reward[i] = winners_reward if team_id == winning_team_id else losers_reward
 
             # for i in range(self.num_players):
             #     if i % 2 == winning_team_id: # There are max two players per team
@@ -174,20 +419,23 @@ class BriscolaEnv(gym.Env):
             #     else:
             #         reward[i] = (120 - winning_score) * -1.5
 
-            info = 'Game over.'
-            observation = self._next_observation()
-        if verbose > 0:
-            print('Observation: ', observation)
-            print('Reward {} by playing card {}'.format(reward, action))
-        if resolve:
-            if verbose > 0:
-                print('-' * 80)
-                print(' ' * 80)
-                print(' ' * 80)
-        return observation.astype(int), reward, done, info
+            if self.info_mode == 'text':
+                info = 'Game over.'
+            elif self.info_mode == 'dict':
+                info = {'cards': [], 'trick_winner': -1, 'points': 0}
+            else:
+                info = {}
+        if verbose or self._on_event is not None:
+            self._event_handler(verbose)('step', {'player': player_id, 'action': action, 'reward': reward,
+                             'done': done, 'observation': self._obs})
+        return reward, done, info
 
     def render(self, mode='human'):
-        print(self.game.teams_score)
+        text = self.field_text()
+        text = '{}\n{}'.format(text, self.game.teams_score) if text else str(self.game.teams_score)
+        if mode == 'ansi':
+            return text
+        print(text)
 
     def close(self):
         pass
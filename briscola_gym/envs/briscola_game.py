@@ -1,5 +1,8 @@
+import operator
 import random
 
+from briscola_gym.envs.briscola_profiling import PhaseStats, instrument, uninstrument, print_event
+
 seed_dict = ['spade', 'bastoni', 'denari', 'coppe']
 
 card_dict = {
@@ -15,8 +18,119 @@ card_dict = {
     'sette': (7, 0),
 }
 
+NUM_CARDS = len(seed_dict) * len(card_dict)
+HAND_SIZE = 3
+
+
+def hand_slot(action, hand_size):
+    """Hand index played by `action` in a hand of `hand_size` cards: the
+    action is clipped to a hand slot, then wrapped on the hand size. Numpy
+    arrays of actions and hand sizes are mapped element-wise."""
+    if getattr(action, 'ndim', 0):
+        return action.clip(0, HAND_SIZE - 1) % hand_size
+    return min(max(int(action), 0), HAND_SIZE - 1) % hand_size
+
+
+def _build_card_tables():
+    # Card ids go from 1 to 40, zero is reserved for the Not-a-Card (NaC) token.
+    names, suits, values, scores = [None], [-1], [0], [0]
+    for suit, _ in enumerate(seed_dict):
+        for name, (value, score) in card_dict.items():
+            names.append(name)
+            suits.append(suit)
+            values.append(value)
+            scores.append(score)
+    return tuple(names), tuple(suits), tuple(values), tuple(scores)
+
+
+CARD_NAME, CARD_SUIT, CARD_VALUE, CARD_SCORE = _build_card_tables()
+CARD_IDS = tuple(range(1, NUM_CARDS + 1))
+
+
+def _build_trick_tables():
+    # TRICK_WINNER[briscola_suit][lead * (NUM_CARDS + 1) + card] is 1 when card
+    # beats the lead card, 0 otherwise. The last plane (briscola_suit == -1) is
+    # used when no briscola has been set yet.
+    stride = NUM_CARDS + 1
+    planes = []
+    for briscola_suit in list(range(len(seed_dict))) + [-1]:
+        plane = [0] * (stride * stride)
+        for lead in CARD_IDS:
+            for card in CARD_IDS:
+                if CARD_SUIT[card] == CARD_SUIT[lead]:
+                    beats = CARD_VALUE[card] > CARD_VALUE[lead]
+                else:
+                    beats = CARD_SUIT[card] == briscola_suit
+                plane[lead * stride + card] = int(beats)
+        planes.append(tuple(plane))
+    points = tuple(CARD_SCORE[lead] + CARD_SCORE[card]
+                   for lead in range(stride) for card in range(stride))
+    return tuple(planes), points
+
+
+TRICK_WINNER, TRICK_POINTS = _build_trick_tables()
+MAX_TEAM_POINTS = sum(CARD_SCORE)
+# Most seats a game can have, dealing a hand to each player
+MAX_SEATS = NUM_CARDS // HAND_SIZE
+
+
+def _build_zobrist_tables():
+    # Fixed 64-bit keys: ZOBRIST_HAND[seat][card], ZOBRIST_FIELD[seat][card],
+    # ZOBRIST_DECK[card], ZOBRIST_BRISCOLA[suit] (zero for no briscola, -1),
+    # ZOBRIST_LEADER[seat] and ZOBRIST_SCORE[team][points].
+    rnd = random.Random(0x5eed)
+
+    def keys(n):
+        return tuple(rnd.getrandbits(64) for _ in range(n))
+    hand = tuple(keys(NUM_CARDS + 1) for _ in range(MAX_SEATS))
+    field = tuple(keys(NUM_CARDS + 1) for _ in range(MAX_SEATS))
+    deck = keys(NUM_CARDS + 1)
+    briscola = keys(len(seed_dict)) + (0,)
+    leader = keys(MAX_SEATS)
+    score = tuple(keys(MAX_TEAM_POINTS + 1) for _ in range(MAX_SEATS // 2))
+    return hand, field, deck, briscola, leader, score
+
+
+(ZOBRIST_HAND, ZOBRIST_FIELD, ZOBRIST_DECK, ZOBRIST_BRISCOLA, ZOBRIST_LEADER,
+ ZOBRIST_SCORE) = _build_zobrist_tables()
+# Hash changes of a card played from a hand to the field, and drawn from the
+# deck to a hand, by seat and card
+_ZOBRIST_PLAY = tuple(tuple(h ^ f for h, f in zip(hand, field))
+                      for hand, field in zip(ZOBRIST_HAND, ZOBRIST_FIELD))
+_ZOBRIST_DRAW = tuple(tuple(h ^ d for h, d in zip(hand, ZOBRIST_DECK)) for hand in ZOBRIST_HAND)
+
+
+class _Random(random.Random):
+    """`random.Random` with the `integers` method of numpy Generators, so
+    that either can drive a game."""
+    def integers(self, high):
+        return self.randrange(high)
+
+    def shuffle(self, x):
+        # Sorting on random keys is faster than the Fisher-Yates of Random
+        random_ = self.random
+        x.sort(key=lambda _: random_())
+
+
+def _default_rng(seed=None):
+    # The engine does not depend on numpy: a Generator (or any object with
+    # `shuffle` and `integers`) is used as is, anything else seeds a _Random
+    if hasattr(seed, 'integers'):
+        return seed
+    if seed is not None and not isinstance(seed, (str, bytes, bytearray)):
+        seed = operator.index(seed)
+    return _Random(seed)
+
+
+def _shell(obj):
+    # Shallow copy that does not call __init__
+    new = object.__new__(obj.__class__)
+    new.__dict__ = obj.__dict__.copy()
+    return new
+
+
 class Card(object):
-    """docstring for Card"""
+    """Read-only view of a card id, used for display."""
     def __init__(self, name, seed, is_briscola=False, card_id=None):
         super(Card, self).__init__()
         self._name = name
@@ -26,6 +140,11 @@ class Card(object):
         self._is_briscola = is_briscola
         self._card_id = card_id
 
+    @classmethod
+    def from_id(cls, card_id, is_briscola=False):
+        return cls(CARD_NAME[card_id], seed_dict[CARD_SUIT[card_id]],
+                   is_briscola=is_briscola, card_id=card_id)
+
     @property
     def name(self):
         return self._name
@@ -62,108 +181,118 @@ class Card(object):
         return self.__str__()
 
 class Deck(object):
-    """docstring for Deck"""
-    def __init__(self, briscola=None):
+    """Deck of card ids, cards are drawn from the end of the list."""
+    def __init__(self, briscola=None, rng=None):
         super(Deck, self).__init__()
-        # Generate list of cards (do not assign briscola now)
-        self._card_dict = {}
+        self._rng = rng if rng is not None else _default_rng()
+        self._cards = []
         self.reset()
         # Set briscola seed if provided
-        self._briscola_ref = None
         if briscola is not None:
             assert briscola in seed_dict
-            self._briscola_seed = briscola
+            self._briscola_suit = seed_dict.index(briscola)
             self.set_briscola(set_from_top=False)
 
+    @property
+    def rng(self):
+        return self._rng
+
+    @rng.setter
+    def rng(self, rng):
+        self._rng = rng
+
     @property
     def card_dict(self):
-        return self._card_dict
+        card_dict = {card_id: self.get_card_from_id(card_id) for card_id in CARD_IDS}
+        card_dict[0] = 0
+        return card_dict
     
     @property
     def briscola(self):
-        return self._briscola_seed
+        if self._briscola_suit < 0:
+            return None
+        return seed_dict[self._briscola_suit]
+
+    @property
+    def briscola_suit(self):
+        return self._briscola_suit
 
     @property
     def briscola_ref(self):
-        return self._briscola_ref
+        if self._briscola_ref_id == 0:
+            return None
+        return self.get_card_from_id(self._briscola_ref_id)
+
+    @property
+    def briscola_ref_id(self):
+        return self._briscola_ref_id
 
     @property
     def briscola_card(self):
-        return self._briscola_card
+        if self._briscola_card_id == 0:
+            return None
+        return self.get_card_from_id(self._briscola_card_id)
 
-    def reset(self):
-        self._cards = []
-        card_id = 1 # zero will be reserved for the Not-a-Card (NaC) token.
-        for seed in seed_dict:
-            for name, _ in card_dict.items():
-                self._cards.append(Card(name, seed, card_id=card_id))
-                self._card_dict[card_id] = Card(name, seed, card_id=card_id)
-                card_id += 1
-        self._card_dict[0] = 0
-        random.shuffle(self._cards)
-        self._briscola_card = None
-        self._briscola_seed = None
-        self._briscola_ref = None
+    @property
+    def briscola_card_id(self):
+        return self._briscola_card_id
+
+    def reset(self, deck_order=None):
+        """Shuffle all the cards back in, or stack them so that they are drawn
+        in `deck_order` (card ids) when given."""
+        if deck_order is None:
+            self._cards[:] = CARD_IDS
+            self._rng.shuffle(self._cards)
+        else:
+            self._cards[:] = [int(card_id) for card_id in reversed(deck_order)]
+        # The briscola card is set aside until drawn, its reference is kept
+        self._briscola_card_id = 0
+        self._briscola_ref_id = 0
+        self._briscola_suit = -1
 
     def set_briscola(self, set_from_top=True):
         # Extract the briscola from main deck (top card)
         if set_from_top:
-            self._briscola_card = self._cards.pop()
-            self._briscola_seed = self._briscola_card.seed
-            self._briscola_ref = self._briscola_card
-            # print('[Deck] Briscola di: ', self._briscola_seed)
-            for card in self._cards:
-                if card.seed == self._briscola_seed:
-                    # print('[Deck] Making {} a briscola.'.format(card))
-                    card.set_briscola()
+            card_id = self._cards.pop()
         else:
-            # Set briscola randomly
-            self._briscola_seed = random.choice(seed_dict)
-            briscole = []
-            for i, card in enumerate(self._cards):
-                if card.is_briscola():
-                    briscole.append((i, card))
-            got_briscola = False
-            while not got_briscola:
-                briscola_idx, self._briscola_card = random.choice(briscole)
-                if self._briscola_card.is_briscola():
-                    got_briscola = True
-            self._briscola_seed = self._briscola_card.seed
-            self._briscola_card = self._cards.pop(briscola_idx)
-            for card in self._cards:
-                if card.seed == self._briscola_seed:
-                    card.set_briscola()
+            # Pick a random card of the briscola seed (or of a random seed)
+            if self._briscola_suit < 0:
+                self._briscola_suit = int(self._rng.integers(len(seed_dict)))
+            briscole = [i for i, card_id in enumerate(self._cards)
+                        if CARD_SUIT[card_id] == self._briscola_suit]
+            card_id = self._cards.pop(briscole[self._rng.integers(len(briscole))])
+        self._briscola_card_id = card_id
+        self._briscola_ref_id = card_id
+        self._briscola_suit = CARD_SUIT[card_id]
+
+    def is_briscola(self, card_id):
+        return CARD_SUIT[card_id] == self._briscola_suit
 
     def get_card_from_id(self, card_id):
-        card = self._card_dict[card_id]
-        if card.seed == self.briscola:
-            card.set_briscola()
-        return card
+        return Card.from_id(card_id, is_briscola=self.is_briscola(card_id))
 
     def pop(self):
         if len(self._cards) == 0:
-            # print('POPPING LAST BRISCOLA CARD: {}'.format(self._briscola_card))
-            card = self._briscola_card
-            self._briscola_card = None
-            return card
+            card_id = self._briscola_card_id
+            self._briscola_card_id = 0
+            return card_id
         else:
             return self._cards.pop()
 
     def __len__(self):
         # Return the cards left plus the briscola
-        total_cards = len(self._cards)
-        if self._briscola_card is not None:
-            return total_cards + 1
+        if self._briscola_card_id != 0:
+            return len(self._cards) + 1
         else:
-            return total_cards
+            return len(self._cards)
 
     def __str__(self):
-        if self._briscola_card is not None:
-            out_str = 'briscola: ' + self._briscola_card.__str__() + '\n'
+        if self._briscola_card_id != 0:
+            out_str = 'briscola: ' + self.briscola_card.__str__() + '\n'
         else:
             out_str = ''
-        for i, card in enumerate(self._cards):
-            out_str += card.__str__()
+        for i, card_id in enumerate(self._cards):
+            out_str += self.get_card_from_id(card_id).__str__()
             if i != len(self._cards) - 1:
                 out_str += '\n'
         return out_str
@@ -172,15 +301,20 @@ class Deck(object):
         return self.__str()
 
 class Hand(object):
-    """docstring for Hand"""
-    def __init__(self):
+    """Card ids held by a player, `cards` gives their Card views."""
+    def __init__(self, deck=None):
         super(Hand, self).__init__()
         # self._cards = {0: 0, 1: 0, 2: 0}
+        self._deck = deck
         self._cards = []
         self._size = 0
 
     @property
     def cards(self):
+        return [self._card_view(card_id) for card_id in self._cards]
+
+    @property
+    def card_ids(self):
         return self._cards
 
     @property
@@ -207,10 +341,15 @@ class Hand(object):
     def highest_card(self):
         high_card = self._cards[0]
         # for pos, card in self._cards.items():
-        for card in self._cards:
-            if card.score > high_card.score:
-                high_card = card
-        return high_card
+        for card_id in self._cards:
+            if CARD_SCORE[card_id] > CARD_SCORE[high_card]:
+                high_card = card_id
+        return self._card_view(high_card)
+
+    def _card_view(self, card_id):
+        if self._deck is not None:
+            return self._deck.get_card_from_id(card_id)
+        return Card.from_id(card_id)
 
     def reset(self):
         # self._cards = {0: None, 1: None, 2: None}
@@ -218,12 +357,12 @@ class Hand(object):
         self._size = 0
 
     def __getitem__(self, i):
-        return self._cards[i]
+        return self._card_view(self._cards[i])
 
     def __str__(self):
         out_str = ''
         # for card in self._cards.items():
-        for card in self._cards:
+        for card in self.cards:
             out_str += str(card) + ', '
         return out_str
 
@@ -232,12 +371,13 @@ class Hand(object):
 
 class Player(object):
     """docstring for Player"""
-    def __init__(self, deck, player_id=0, team_id=0):
+    def __init__(self, deck, player_id=0, team_id=0, rng=None):
         super(Player, self).__init__()
         self._deck = deck
+        self._rng = rng if rng is not None else _default_rng()
         self._player_id = player_id
         self._team_id = team_id
-        self._hand = Hand()
+        self._hand = Hand(deck)
         self._score = 0
 
     @property
@@ -260,6 +400,14 @@ class Player(object):
     def team_id(self):
         return self._team_id
 
+    @property
+    def rng(self):
+        return self._rng
+
+    @rng.setter
+    def rng(self, rng):
+        self._rng = rng
+
     def reset(self):
         self._hand.reset()
 
@@ -276,26 +424,50 @@ class Player(object):
         field.add_card(self._hand.get_card(i), self._player_id, self._team_id)
 
     def play_random(self):
-        return self._hand.get_card(random.randint(0, self._hand.size - 1))
+        return self._hand.get_card(int(self._rng.integers(self._hand.size)))
 
     def play_dummy_ai(self):
         pass
 
 class Field(object):
-    """docstring for Field"""
-    def __init__(self):
+    """Cards played in the current trick as (card id, player id, team id).
+
+    The points of the trick, per team and per player, the number of cards
+    played since the last reset and their bitmask (card id `c` is bit
+    `c - 1`) are kept up to date as cards are added.
+    """
+    def __init__(self, deck=None):
         super(Field, self).__init__()
+        self._deck = deck
         self._cards = []
         self._score = 0
+        self._teams_scores = {}
+        self._players_scores = {}
+        self._num_played = 0
+        self._played_mask = 0
         self._winning_team_id = None
 
     @property
     def score(self):
         return self._score
 
+    @property
+    def num_played(self):
+        return self._num_played
+
+    @property
+    def played_mask(self):
+        return self._played_mask
+
     @property
     def cards(self):
-        return self._cards
+        return [(self._card_view(card_id), player_id, team_id)
+                for card_id, player_id, team_id in self._cards]
+
+    def _card_view(self, card_id):
+        if self._deck is not None:
+            return self._deck.get_card_from_id(card_id)
+        return Card.from_id(card_id)
     
     def get_cards(self):
         cards = []
@@ -307,46 +479,48 @@ class Field(object):
         return self._cards
 
     def get_score(self):
-        score = 0
-        if self._cards != []:
-            for card, _, _ in self._cards:
-                score += card.score
-        return score
+        return self._score
 
     def add_card(self, card, player_id, team_id):
         self._cards.append((card, player_id, team_id))
-        self._score += card.score
+        score = CARD_SCORE[card]
+        self._score += score
+        teams_scores = self._teams_scores
+        teams_scores[team_id] = teams_scores.get(team_id, 0) + score
+        self._players_scores[player_id] = score
+        self._num_played += 1
+        self._played_mask |= 1 << (card - 1)
 
     def get_current_winner(self):
+        if self._deck is not None:
+            trick_winner = TRICK_WINNER[self._deck.briscola_suit]
+        else:
+            trick_winner = TRICK_WINNER[-1]
         winner_card, winner_player_id, winner_team_id = self._cards[0]
         for card, player_id, team_id in self._cards[1:]:
-            if card.seed == winner_card.seed:
-                if card.score > winner_card.score:
-                    winner_card = card
-                    winner_player_id = player_id
-                    winner_team_id = team_id
-            elif card.seed != winner_card.seed:
-                if card.is_briscola():
-                    winner_card = card
-                    winner_player_id = player_id
-                    winner_team_id = team_id
+            if trick_winner[winner_card * (NUM_CARDS + 1) + card]:
+                winner_card = card
+                winner_player_id = player_id
+                winner_team_id = team_id
         return winner_player_id, winner_team_id
 
     def get_teams_scores(self):
-        scores = {}
-        for card, _, team_id in self._cards:
-            scores[team_id] = 0
-        for card, player_id, _ in self._cards:
-            scores[team_id] += card.value
-        return scores
+        """Points on the field by team id."""
+        return dict(self._teams_scores)
 
     def get_players_scores(self):
-        scores = {}
-        for card, player_id, _ in self._cards:
-            scores[player_id] = 0
-        for card, player_id, _ in self._cards:
-            scores[player_id] += card.value
-        return scores
+        """Points on the field by player id."""
+        return dict(self._players_scores)
+
+    def _rebuild(self, num_played, played_mask):
+        # Recompute the running totals from the cards on the field and the
+        # count and mask of the cards played in the previous tricks
+        cards = self._cards
+        self.clear_field()
+        self._num_played = num_played
+        self._played_mask = played_mask
+        for entry in cards:
+            self.add_card(*entry)
 
     def get_winner_and_score(self):
         winner_player_id, winner_team_id = self.get_current_winner()
@@ -356,13 +530,18 @@ class Field(object):
 
     def clear_field(self):
         self._cards = []
+        self._score = 0
+        self._teams_scores.clear()
+        self._players_scores.clear()
 
     def reset(self):
         self.clear_field()
+        self._num_played = 0
+        self._played_mask = 0
 
     def __str__(self):
         out_str = ''
-        for i, (card, player_id, team_id) in enumerate(self._cards):
+        for i, (card, player_id, team_id) in enumerate(self.cards):
             # out_str += '{}'.format(card)
             out_str += '{} giocata da giocatore {} in team {}'.format(card, player_id, team_id)
             if i != len(self._cards) - 1:
@@ -373,31 +552,71 @@ class Field(object):
         return self.__str()
 
 class Game(object):
-    """docstring for Game"""
-    def __init__(self, num_players=2, num_players_per_team=2, init_game=True):
+    """Briscola game between `num_players` players.
+
+    Setting `on_event` to a callable `handler(event, data)` reports the
+    resolved tricks ('trick') and the end of simulated games ('game_over');
+    with `verbose` set and no handler they are printed by `print_event`.
+    """
+    # Methods timed by enable_profiling, and their phase names
+    _PROFILED_PHASES = {
+        'player_play_card': 'play_card',
+        'random_step': 'random_step',
+        'resolve_step': 'resolve_step',
+        '_draw_cards': 'draw_cards',
+    }
+
+    def __init__(self, num_players=2, num_players_per_team=2, init_game=True, seed=None):
         super(Game, self).__init__()
         assert num_players % 2 == 0, 'The number of players must be an even number.'
+        assert num_players <= MAX_SEATS, 'At most {} players can play.'.format(MAX_SEATS)
         self._num_players = num_players
-        self._deck = Deck()
-        self._field = Field()
+        self._num_players_per_team = num_players_per_team
+        # A single generator shared by the deck and the players of this game
+        self._rng = _default_rng(seed)
+        self.on_event = None
+        self._stats = None
+        self._deck = Deck(rng=self._rng)
+        self._deck_order = self._deck._cards[::-1]
+        self._field = Field(self._deck)
         self._players = []
         self._teams_score = {}
+        # Teams sit alternately, e.g. seats 0 and 2 against 1 and 3 with four
+        # players; with two players each one is a team
+        self._num_teams = max(2, num_players // num_players_per_team)
         for i in range(num_players):
-            self._players.append(Player(self._deck, player_id=i, team_id=(i % num_players_per_team)))
-        if num_players == 2:
-            num_teams = 2
-        else:
-            num_teams = num_players // 2
-        for i in range(num_teams):
+            self._players.append(Player(self._deck, player_id=i, team_id=i % self._num_teams,
+                                        rng=self._rng))
+        for i in range(self._num_teams):
             self._teams_score[i] = 0
+        self._last_winner_id = 0
+        self._last_winner_team_id = 0
+        self._turn_cnt = 0
+        # Resolved tricks as (leader id, winner id, points, card ids in play order)
+        self._tricks = []
+        # Hash of a reset game but for the leader: all the cards in the deck
+        # and no points
+        self._reset_hash = 0
+        for card_id in CARD_IDS:
+            self._reset_hash ^= ZOBRIST_DECK[card_id]
+        for team_id in self._teams_score:
+            self._reset_hash ^= ZOBRIST_SCORE[team_id][0]
+        self._rehash()
         if init_game:
             self.init_game()
             self._game_started = True
         else:
             self._game_started = False
-        self._last_winner_id = 0
-        self._last_winner_team_id = 0
-        self._turn_cnt = 0
+        # Snapshot layout: deck size and cards, briscola card, reference and
+        # suit, hand size and cards per player, field size and (card, player,
+        # team) per player, field score, teams score, last winner, last winner
+        # team, turn count, game started flag, players score, then the number
+        # of tricks and (leader, winner, points, cards) per trick.
+        self._hand_offset = 1 + NUM_CARDS + 3
+        self._field_offset = self._hand_offset + (1 + HAND_SIZE) * num_players
+        self._game_offset = self._field_offset + 2 + 3 * num_players
+        self._trick_offset = self._game_offset + len(self._teams_score) + 4 + num_players
+        self._snapshot_size = self._trick_offset + 1 + (NUM_CARDS // num_players) * (3 + num_players)
 
     @property
     def last_winner_id(self):
@@ -411,6 +630,16 @@ class Game(object):
     def num_players(self):
         return self._num_players
 
+    @property
+    def num_teams(self):
+        return self._num_teams
+
+    def partner_ids(self, player_id):
+        """Ids of the other players in the team of `player_id`."""
+        team_id = self._players[player_id].team_id
+        return [player.player_id for player in self._players
+                if player.team_id == team_id and player.player_id != player_id]
+
     @property
     def deck(self):
         return self._deck
@@ -427,76 +656,331 @@ class Game(object):
     def teams_score(self):
         return self._teams_score
 
+    @property
+    def players_score(self):
+        """Points won by every player."""
+        return [player.score for player in self._players]
+
+    @property
+    def tricks(self):
+        """Resolved tricks as (leader id, winner id, points, card ids in play
+        order), oldest first."""
+        return tuple(self._tricks)
+
+    @property
+    def played_mask(self):
+        """Bitmask of the cards played so far, card id `c` is bit `c - 1`."""
+        return self._field.played_mask
+
+    @property
+    def state_hash(self):
+        """64-bit Zobrist hash of the position, kept up to date as cards are
+        played, drawn and tricks resolved. It covers the cards in every hand
+        (regardless of their order) and on the field by seat, the cards left
+        in the deck (as a set, the face up briscola included), the briscola
+        suit, the teams score and the leader of the trick."""
+        return self._hash
+
+    def _rehash(self):
+        # Hash of the position computed from scratch
+        deck = self._deck
+        h = ZOBRIST_BRISCOLA[deck._briscola_suit] ^ ZOBRIST_LEADER[self._last_winner_id]
+        for card_id in deck._cards:
+            h ^= ZOBRIST_DECK[card_id]
+        if deck._briscola_card_id != 0:
+            h ^= ZOBRIST_DECK[deck._briscola_card_id]
+        for player in self._players:
+            keys = ZOBRIST_HAND[player._player_id]
+            for card_id in player._hand._cards:
+                h ^= keys[card_id]
+        for card_id, player_id, _ in self._field._cards:
+            h ^= ZOBRIST_FIELD[player_id][card_id]
+        for team_id, score in self._teams_score.items():
+            h ^= ZOBRIST_SCORE[team_id][score]
+        self._hash = h
+        return h
+
+    @property
+    def deck_order(self):
+        """Card ids of the current game in draw order: the cards dealt one at
+        a time to each player, the briscola, then the cards drawn after the
+        tricks (the briscola being actually drawn last)."""
+        return self._deck_order
+
+    @property
+    def rng(self):
+        return self._rng
+
+    def seed(self, seed=None):
+        """Reseed the game with a new generator, `seed` can be None, an int
+        or a generator such as a numpy Generator."""
+        self._rng = _default_rng(seed)
+        self._deck.rng = self._rng
+        for player in self._players:
+            player.rng = self._rng
+
+    def enable_profiling(self, stats=None):
+        """Start timing the game phases into `stats` (a new `PhaseStats` by
+        default) and return it."""
+        self._stats = stats if stats is not None else PhaseStats()
+        instrument(self, self._PROFILED_PHASES, self._stats)
+        return self._stats
+
+    def disable_profiling(self):
+        uninstrument(self, self._PROFILED_PHASES)
+
+    def stats(self):
+        """Calls and cumulative time_ns of every profiled phase."""
+        if self._stats is None:
+            return {}
+        return self._stats.as_dict()
+
+    def snapshot(self):
+        """Return the whole game state as a fixed-size bytes record."""
+        deck = self._deck
+        cards = deck._cards
+        state = bytearray(self._snapshot_size)
+        state[0] = len(cards)
+        state[1:1 + len(cards)] = cards
+        pos = 1 + NUM_CARDS
+        state[pos] = deck._briscola_card_id
+        state[pos + 1] = deck._briscola_ref_id
+        state[pos + 2] = deck._briscola_suit + 1
+        pos = self._hand_offset
+        for player in self._players:
+            hand = player._hand._cards
+            state[pos] = len(hand)
+            state[pos + 1:pos + 1 + len(hand)] = hand
+            pos += 1 + HAND_SIZE
+        field = self._field._cards
+        state[pos] = len(field)
+        pos += 1
+        for entry in field:
+            state[pos:pos + 3] = entry
+            pos += 3
+        pos = self._game_offset - 1
+        state[pos] = self._field._score
+        state[pos + 1:self._trick_offset] = (
+            *self._teams_score.values(), self._last_winner_id, self._last_winner_team_id,
+            self._turn_cnt, self._game_started, *self.players_score)
+        pos = self._trick_offset
+        state[pos] = len(self._tricks)
+        pos += 1
+        for leader_id, winner_id, points, cards in self._tricks:
+            state[pos:pos + 3] = (leader_id, winner_id, points)
+            state[pos + 3:pos + 3 + len(cards)] = cards
+            pos += 3 + self._num_players
+        return bytes(state)
+
+    def restore(self, state):
+        """Set the game state from a record returned by `snapshot`."""
+        deck = self._deck
+        deck._cards[:] = state[1:1 + state[0]]
+        pos = 1 + NUM_CARDS
+        deck._briscola_card_id = state[pos]
+        deck._briscola_ref_id = state[pos + 1]
+        deck._briscola_suit = state[pos + 2] - 1
+        pos = self._hand_offset
+        for player in self._players:
+            hand = player._hand
+            hand._size = size = state[pos]
+            hand._cards[:] = state[pos + 1:pos + 1 + size]
+            pos += 1 + HAND_SIZE
+        field = self._field
+        pos += 1
+        field._cards[:] = [tuple(state[i:i + 3])
+                           for i in range(pos, pos + 3 * state[pos - 1], 3)]
+        pos = self._game_offset - 1
+        field._score = state[pos]
+        for team_id in self._teams_score:
+            pos += 1
+            self._teams_score[team_id] = state[pos]
+        self._last_winner_id = state[pos + 1]
+        self._last_winner_team_id = state[pos + 2]
+        self._turn_cnt = state[pos + 3]
+        self._game_started = bool(state[pos + 4])
+        pos += 5
+        for player in self._players:
+            player.score = state[pos]
+            pos += 1
+        num_players = self._num_players
+        num_played = 0
+        played_mask = 0
+        self._tricks = tricks = []
+        pos += 1
+        for _ in range(state[pos - 1]):
+            cards = tuple(state[pos + 3:pos + 3 + num_players])
+            tricks.append((state[pos], state[pos + 1], state[pos + 2], cards))
+            num_played += num_players
+            for card_id in cards:
+                played_mask |= 1 << (card_id - 1)
+            pos += 3 + num_players
+        field._rebuild(num_played, played_mask)
+        self._rehash()
+
+    def clone(self):
+        """Return an independent copy of the game, sharing its generator.
+
+        This copies the same state captured by `snapshot`, directly from list
+        to list instead of going through the bytes record.
+        """
+        # Copy the object graph shells without going through the constructors
+        game = _shell(self)
+        game._deck = deck = _shell(self._deck)
+        deck._cards = self._deck._cards[:]
+        game._field = field = _shell(self._field)
+        field._deck = deck
+        field._cards = self._field._cards[:]
+        field._teams_scores = self._field._teams_scores.copy()
+        field._players_scores = self._field._players_scores.copy()
+        game._tricks = self._tricks[:]
+        game._players = players = []
+        for player in self._players:
+            player = _shell(player)
+            player._deck = deck
+            player._hand = hand = _shell(player._hand)
+            hand._deck = deck
+            hand._cards = hand._cards[:]
+            players.append(player)
+        game._teams_score = self._teams_score.copy()
+        # Profiling wrappers and event handlers are bound to this game
+        uninstrument(game, self._PROFILED_PHASES)
+        game._stats = None
+        game.on_event = None
+        return game
+
     def init_game(self):
-        for _ in range(3):
+        h = self._hash
+        deck = self._deck
+        for _ in range(HAND_SIZE):
             for player in self._players:
-                player.draw(self._deck)
-        self._deck.set_briscola()
-        for player in self._players:
-            for card in player.hand:
-                if card.seed == self._deck.briscola:
-                    card.set_briscola()
+                card_id = deck.pop()
+                player._hand.add_card(card_id)
+                h ^= _ZOBRIST_DRAW[player._player_id][card_id]
+        deck.set_briscola()
+        self._hash = (h ^ ZOBRIST_BRISCOLA[deck._briscola_suit]
+                      ^ ZOBRIST_LEADER[self._last_winner_id] ^ ZOBRIST_LEADER[0])
         self._last_winner_id = 0
         self._game_started = True
 
-    def reset(self):
+    def reset(self, deck_order=None):
         for player in self._players:
             player.reset()
+            player.score = 0
+        self._tricks = []
         self._turn_cnt = 0
         self._field.reset()
-        self._deck.reset()
-        if self._num_players == 2:
-            num_teams = 2
-        else:
-            num_teams = self._num_players // 2
-        for i in range(num_teams):
+        self._deck.reset(deck_order)
+        self._deck_order = self._deck._cards[::-1]
+        for i in range(self._num_teams):
             self._teams_score[i] = 0
+        if deck_order is None:
+            self._hash = self._reset_hash ^ ZOBRIST_LEADER[self._last_winner_id]
+        else:
+            self._rehash()
+
+    def replay(self, deck_order, actions, upto=None):
+        """Deal `deck_order` and play the first `upto` card ids of `actions`
+        (all of them by default) in turn, resolving the tricks. Returns the
+        game, now in the position reached."""
+        self.reset(deck_order)
+        self.init_game()
+        if upto is None:
+            upto = len(actions)
+        num_players = self._num_players
+        field = self._field
+        for card_id in actions[:upto]:
+            card_id = int(card_id)
+            player = self._players[(self._last_winner_id + len(field._cards)) % num_players]
+            card_ids = player.hand.card_ids
+            if card_id not in card_ids:
+                raise ValueError('Card {} is not in the hand of player {}.'.format(
+                    card_id, player.player_id))
+            self.player_play_card(player.player_id, card_ids.index(card_id))
+            if len(field._cards) == num_players:
+                self.resolve_step()
+        return self
 
     def player_play_card(self, player_id, card_index):
-        self._players[player_id].play(card_index, self._field)
+        player = self._players[player_id]
+        card_id = player._hand.get_card(card_index)
+        self._field.add_card(card_id, player_id, player._team_id)
+        self._hash ^= _ZOBRIST_PLAY[player_id][card_id]
 
     def players_hand_size(self):
-        hand_size = 0
-        for player in self._players:
-            hand_size += player.hand_size()
-        return hand_size
+        # Every card not in the deck was dealt and is either held or played
+        return NUM_CARDS - len(self._deck) - self._field._num_played
+
+    def _event_handler(self, verbose):
+        if self.on_event is not None:
+            return self.on_event
+        return print_event if verbose else None
 
     def resolve_step(self, verbose=0):
         self._turn_cnt += 1
-        if verbose == 1:
-            print(self._field)
         winner_player_id, winner_team_id, score = self._field.get_winner_and_score()
-        if verbose:
-            print(f'Vince giocatore {winner_player_id} con {score} punti (briscola: {self.deck.briscola})')
+        cards = self._field.get_cards_and_ids()
+        if verbose or self.on_event is not None:
+            self._event_handler(verbose)('trick', {'cards': list(cards),
+                              'winner': winner_player_id, 'team': winner_team_id,
+                              'score': score, 'briscola': self._deck.briscola})
+        h = self._hash ^ ZOBRIST_LEADER[self._last_winner_id] ^ ZOBRIST_LEADER[winner_player_id]
+        trick = []
+        for card_id, player_id, _ in cards:
+            trick.append(card_id)
+            h ^= ZOBRIST_FIELD[player_id][card_id]
+        self._tricks.append((cards[0][1], winner_player_id, score, tuple(trick)))
+        team_keys = ZOBRIST_SCORE[winner_team_id]
+        team_score = self._teams_score[winner_team_id]
+        self._hash = h ^ team_keys[team_score] ^ team_keys[team_score + score]
         self._last_winner_id = winner_player_id
         self._last_winner_team_id = winner_team_id
         self._teams_score[winner_team_id] += score
+        self._players[winner_player_id].score += score
         if len(self._deck) > 0:
-            for i in range(self._num_players):
-                self._players[(winner_player_id + i) % self._num_players].draw(self._deck)
+            self._draw_cards(winner_player_id)
         self._field.clear_field()
         return winner_player_id, winner_team_id
 
+    def _draw_cards(self, first_player_id):
+        h = self._hash
+        deck = self._deck
+        for i in range(self._num_players):
+            player = self._players[(first_player_id + i) % self._num_players]
+            card_id = deck.pop()
+            player._hand.add_card(card_id)
+            h ^= _ZOBRIST_DRAW[player._player_id][card_id]
+        self._hash = h
+
     def random_step(self, debug=False):
+        if not debug:
+            field = self._field
+            h = self._hash
+            for i in range(self._num_players):
+                player = self._players[(self._last_winner_id + i) % self._num_players]
+                card_id = player.play_random()
+                field.add_card(card_id, player._player_id, player._team_id)
+                h ^= _ZOBRIST_PLAY[player._player_id][card_id]
+            self._hash = h
+            return
         for i in range(self._num_players):
             player = self._players[(self._last_winner_id + i) % self._num_players]
-            if not debug:
-                self._field.add_card(player.play_random(), player.player_id, player.team_id)
+            if i == 0:
+                print('Gioca per primo il giocatore {} team {}'.format(self._last_winner_id, self._players[self._last_winner_id].team_id))
             else:
-                if i == 0:
-                    print('Gioca per primo il giocatore {} team {}'.format(self._last_winner_id, self._players[self._last_winner_id].team_id))
-                else:
-                    print('Gioca il giocatore {} team {}'.format((self._last_winner_id + i) % self._num_players, self._players[(self._last_winner_id + i) % self._num_players].team_id))
-                if (self._last_winner_id + i) % self._num_players == 0:
-                    hand = player.hand
-                    index = int(input('Scegli una carta:\n0: {}\n1: {}\n2: {}\n'.format(hand[0], hand[1], hand[2])))
-                    player.play(index, self._field)
-                else:
-                    self._field.add_card(player.play_random(), player.player_id, player.team_id)
+                print('Gioca il giocatore {} team {}'.format((self._last_winner_id + i) % self._num_players, self._players[(self._last_winner_id + i) % self._num_players].team_id))
+            if (self._last_winner_id + i) % self._num_players == 0:
+                hand = player.hand
+                index = int(input('Scegli una carta:\n0: {}\n1: {}\n2: {}\n'.format(hand[0], hand[1], hand[2])))
+                self.player_play_card(player.player_id, index)
+            else:
+                card_id = player.play_random()
+                self._field.add_card(card_id, player.player_id, player.team_id)
+                self._hash ^= _ZOBRIST_PLAY[player._player_id][card_id]
         # print('{}'.format(self._field))
 
     def step(self):
-        # self.random_step()
+        self.random_step()
         self.resolve_step()
 
     def get_winner_team(self):
@@ -508,12 +992,15 @@ class Game(object):
                 winning_team = team_id
         return winning_team, winning_score
 
-    def simulate_random_game(self):
+    def simulate_random_game(self, verbose=1):
         while self.players_hand_size() > 0:
             self.step()
             # print('-' * 80)
         winning_team, winning_score = self.get_winner_team()
-        print('Vince il team {} con {} punti.'.format(winning_team, winning_score))
+        handler = self._event_handler(verbose)
+        if handler is not None:
+            handler('game_over', {'team': winning_team, 'score': winning_score})
+        return winning_team, winning_score
 
 
 def main():
@@ -0,0 +1,189 @@
+from briscola_gym.envs.briscola_multiagent import BriscolaMultiAgentVecEnv
+
+import numpy as np
+
+
+class OpponentLeague(object):
+    """Pool of frozen batched policy snapshots sampled as opponents.
+
+    Snapshots are added under a name with a priority, and sampled with
+    probability proportional to it. Once the pool holds `capacity` snapshots,
+    adding one evicts the least recently sampled snapshot (eviction='lru') or
+    the one with the lowest priority (eviction='priority'). Policies are
+    called as in `play_match`: `policy(observations, action_masks)`.
+    """
+    def __init__(self, capacity=16, eviction='lru', seed=None):
+        super(OpponentLeague, self).__init__()
+        assert eviction in ('lru', 'priority')
+        self.capacity = capacity
+        self.eviction = eviction
+        self._rng = np.random.default_rng(seed)
+        # name -> [uid, policy, priority, last sampled]
+        self._snapshots = {}
+        self._next_uid = 0
+        self._clock = 0
+
+    def __len__(self):
+        return len(self._snapshots)
+
+    def __contains__(self, name):
+        return name in self._snapshots
+
+    @property
+    def names(self):
+        return list(self._snapshots)
+
+    def add(self, name, policy, priority=1.):
+        """Add (or replace) the snapshot `name`, returning the names of the
+        evicted snapshots."""
+        evicted = []
+        if name in self._snapshots:
+            del self._snapshots[name]
+        while len(self._snapshots) >= self.capacity:
+            evicted.append(self._victim())
+            del self._snapshots[evicted[-1]]
+        self._clock += 1
+        self._snapshots[name] = [self._next_uid, policy, float(priority), self._clock]
+        self._next_uid += 1
+        return evicted
+
+    def _victim(self):
+        if self.eviction == 'lru':
+            key = lambda name: self._snapshots[name][3]
+        else:
+            key = lambda name: (self._snapshots[name][2], self._snapshots[name][3])
+        return min(self._snapshots, key=key)
+
+    def remove(self, name):
+        del self._snapshots[name]
+
+    def set_priority(self, name, priority):
+        self._snapshots[name][2] = float(priority)
+
+    def sample(self, n):
+        """Sample `n` opponents, returning their uids and a dict from these
+        uids to the policies."""
+        snapshots = list(self._snapshots.values())
+        assert snapshots, 'The league is empty.'
+        priority = np.array([snapshot[2] for snapshot in snapshots])
+        chosen = self._rng.choice(len(snapshots), size=n, p=priority / priority.sum())
+        uids = np.empty(n, dtype=np.int64)
+        policies = {}
+        for i in np.unique(chosen):
+            snapshot = snapshots[i]
+            self._clock += 1
+            snapshot[3] = self._clock
+            uids[chosen == i] = snapshot[0]
+            policies[snapshot[0]] = snapshot[1]
+        return uids, policies
+
+
+class LeagueVecEnv(object):
+    """Batch of games where a single learner plays against league opponents.
+
+    Every episode samples an opponent snapshot from `league` and the team of
+    the learner (or always `learner_team` when given). `step` plays the
+    learner actions, then advances the opponent seats internally: at every
+    turn the opponent decisions pending across all the games are gathered
+    and evaluated with one call per sampled snapshot, until the learner is to
+    move again everywhere. Observations follow `BriscolaMultiAgentVecEnv`
+    (in `observation_mode`) from the seat of the learner to move; rewards are the points won by the
+    learner team since its previous move. Finished games are reset as in
+    `BriscolaMultiAgentVecEnv`, whose final observation goes to
+    `info['terminal_observation']`.
+    """
+    def __init__(self, num_envs, league, num_players=2, learner_team=None, seed=None,
+                 observation_mode='seat'):
+        super(LeagueVecEnv, self).__init__()
+        self.num_envs = num_envs
+        self.num_players = num_players
+        self.league = league
+        self.learner_team = learner_team
+        self.env = BriscolaMultiAgentVecEnv(num_envs, num_players=num_players, seed=seed,
+                                            observation_mode=observation_mode)
+        self.observation_space = self.env.observation_space
+        self.action_space = self.env.action_space
+        self._rng = np.random.default_rng(seed)
+        self._team = np.zeros(num_envs, dtype=np.int8)
+        self._opponent = np.zeros(num_envs, dtype=np.int64)
+        self._policies = {}
+        self._rewards = np.zeros(num_envs, dtype=np.float32)
+        self._dones = np.zeros(num_envs, dtype=np.bool_)
+        self._all = np.arange(num_envs)
+
+    @property
+    def opponents(self):
+        """uid of the opponent snapshot of every game."""
+        return self._opponent
+
+    @property
+    def learner_teams(self):
+        return self._team
+
+    def _start_episodes(self, index):
+        if self.learner_team is None:
+            self._team[index] = self._rng.integers(2, size=len(index))
+        else:
+            self._team[index] = self.learner_team
+        uids, policies = self.league.sample(len(index))
+        self._opponent[index] = uids
+        self._policies.update(policies)
+        # Drop the snapshots no game plays against anymore
+        active = set(np.unique(self._opponent).tolist())
+        for uid in list(self._policies):
+            if uid not in active:
+                del self._policies[uid]
+
+    def _collect(self, rewards, dones, info, terminal):
+        self._rewards += rewards[self._all, self._team]
+        if dones.any():
+            done_index = np.flatnonzero(dones)
+            self._dones[done_index] = True
+            terminal.append((done_index, info['terminal_observation']))
+            self._start_episodes(done_index)
+
+    def _play_opponents(self, obs, terminal):
+        while True:
+            rows = np.flatnonzero(obs['seat'] % 2 != self._team)
+            if len(rows) == 0:
+                return obs
+            actions = np.empty(len(rows), dtype=np.int64)
+            uids = self._opponent[rows]
+            for uid in np.unique(uids):
+                selected = uids == uid
+                games = rows[selected]
+                actions[selected] = self._policies[uid](obs['observation'][games],
+                                                        obs['action_mask'][games])
+            obs, rewards, dones, info = self.env.step(actions, rows)
+            self._collect(rewards, dones, info, terminal)
+
+    def seed(self, seed=None):
+        self._rng = np.random.default_rng(seed)
+        self.env.seed(seed)
+        return [seed]
+
+    def reset(self, seed=None):
+        if seed is not None:
+            self.seed(seed)
+        obs = self.env.reset()
+        self._start_episodes(self._all)
+        return self._play_opponents(obs, [])
+
+    def step(self, actions):
+        """Play `actions[g]` for the learner seat to move in every game `g`."""
+        self._rewards[:] = 0
+        self._dones[:] = False
+        terminal = []
+        obs, rewards, dones, info = self.env.step(actions)
+        self._collect(rewards, dones, info, terminal)
+        obs = self._play_opponents(obs, terminal)
+        info = {}
+        if terminal:
+            # Games end at most once per step: reorder by game
+            index = np.concatenate([index for index, _ in terminal])
+            observations = np.concatenate([observation for _, observation in terminal])
+            info['terminal_observation'] = observations[np.argsort(index)]
+        return obs, self._rewards, self._dones, info
+
+    def close(self):
+        self.env.close()
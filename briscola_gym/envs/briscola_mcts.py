@@ -0,0 +1,186 @@
+import math
+import random
+import time
+
+from briscola_gym.envs.briscola_game import NUM_CARDS, CARD_SCORE, TRICK_WINNER
+
+MAX_POINTS = 120
+
+
+class Playout(object):
+    """Plain list Briscola position used for fast playouts.
+
+    Hands are lists of card ids, the deck is drawn from the end of the list
+    and holds the briscola card at index 0, so that it is drawn last.
+    """
+    __slots__ = ('num_players', 'hands', 'deck', 'field', 'leader', 'to_move',
+                 'points', 'trick_winner')
+
+    def __init__(self, hands, deck, field, leader, points, briscola_suit):
+        self.num_players = len(hands)
+        self.hands = hands
+        self.deck = deck
+        self.field = field
+        self.leader = leader
+        self.to_move = (leader + len(field)) % self.num_players
+        self.points = points
+        self.trick_winner = TRICK_WINNER[briscola_suit]
+
+    def is_over(self):
+        return not self.hands[self.to_move]
+
+    def play(self, card):
+        num_players = self.num_players
+        self.hands[self.to_move].remove(card)
+        field = self.field
+        field.append(card)
+        if len(field) < num_players:
+            self.to_move = (self.to_move + 1) % num_players
+            return
+        trick_winner = self.trick_winner
+        winner_card = field[0]
+        winner_offset = 0
+        score = CARD_SCORE[winner_card]
+        for i in range(1, num_players):
+            card = field[i]
+            score += CARD_SCORE[card]
+            if trick_winner[winner_card * (NUM_CARDS + 1) + card]:
+                winner_card = card
+                winner_offset = i
+        winner = (self.leader + winner_offset) % num_players
+        self.points[winner % 2] += score
+        if self.deck:
+            for i in range(num_players):
+                self.hands[(winner + i) % num_players].append(self.deck.pop())
+        field.clear()
+        self.leader = winner
+        self.to_move = winner
+
+    def play_random(self, rnd):
+        while self.hands[self.to_move]:
+            hand = self.hands[self.to_move]
+            self.play(hand[int(rnd.random() * len(hand))])
+
+    def margin(self, team_id):
+        return (self.points[team_id] - self.points[1 - team_id]) / MAX_POINTS
+
+
+def determinize(game, player_id, rnd):
+    """Sample a `Playout` of `game` as seen by `player_id`.
+
+    The unseen cards (deck and the other hands) are dealt at random, keeping
+    the hand sizes and the publicly known position of the briscola card.
+    """
+    deck = game.deck
+    briscola = deck.briscola_ref_id
+    players = game.players
+    unseen = list(deck._cards)
+    for player in players:
+        if player.player_id != player_id:
+            unseen.extend(card for card in player.hand.card_ids if card != briscola)
+    rnd.shuffle(unseen)
+    hands = []
+    for player in players:
+        card_ids = player.hand.card_ids
+        if player.player_id == player_id:
+            hands.append(list(card_ids))
+            continue
+        hand = [briscola] if briscola in card_ids else []
+        while len(hand) < len(card_ids):
+            hand.append(unseen.pop())
+        hands.append(hand)
+    if deck.briscola_card_id != 0:
+        unseen.insert(0, deck.briscola_card_id)
+    field = [card for card, _, _ in game.field.get_cards_and_ids()]
+    points = [game.teams_score[0], game.teams_score[1]]
+    return Playout(hands, unseen, field, game.last_winner_id, points, deck.briscola_suit)
+
+
+class _Node(object):
+    __slots__ = ('move', 'team_id', 'parent', 'children', 'visits', 'reward', 'avail')
+
+    def __init__(self, move=None, team_id=0, parent=None):
+        self.move = move
+        self.team_id = team_id
+        self.parent = parent
+        self.children = {}
+        self.visits = 0
+        self.reward = 0.
+        self.avail = 1
+
+
+class ISMCTSPlayer(object):
+    """Single-observer information set MCTS opponent.
+
+    Every iteration samples a determinization of the hidden cards, descends
+    the shared tree choosing among the moves legal in it with UCB, expands one
+    node and finishes the game with a random `Playout`. The search stops after
+    `iterations` iterations or `time_budget` seconds, whichever comes first,
+    but always runs at least one iteration.
+    Calling the player with a `Game` and a seat returns the hand index to play.
+    """
+    def __init__(self, iterations=1000, time_budget=None, exploration=0.7, seed=None):
+        super(ISMCTSPlayer, self).__init__()
+        assert iterations is not None or time_budget is not None
+        if iterations is not None and iterations <= 0:
+            raise ValueError('iterations must be positive, got {!r}.'.format(iterations))
+        if time_budget is not None and time_budget <= 0:
+            raise ValueError('time_budget must be positive, got {!r}.'.format(time_budget))
+        self.iterations = iterations
+        self.time_budget = time_budget
+        self.exploration = exploration
+        self._rnd = random.Random(seed)
+
+    def __call__(self, game, player_id):
+        return game.players[player_id].hand.card_ids.index(self.search(game, player_id))
+
+    def search(self, game, player_id):
+        """Return the card id to play for `player_id`."""
+        card_ids = game.players[player_id].hand.card_ids
+        if len(card_ids) == 1:
+            return card_ids[0]
+        rnd = self._rnd
+        exploration = self.exploration
+        root = _Node()
+        iterations = self.iterations
+        deadline = None
+        if self.time_budget is not None:
+            deadline = time.perf_counter() + self.time_budget
+        i = 0
+        while iterations is None or i < iterations:
+            if i > 0 and deadline is not None and time.perf_counter() > deadline:
+                break
+            i += 1
+            position = determinize(game, player_id, rnd)
+            node = root
+            # Selection, among the children legal in this determinization
+            while not position.is_over():
+                hand = position.hands[position.to_move]
+                untried = [card for card in hand if card not in node.children]
+                if untried:
+                    break
+                best, best_value = None, -math.inf
+                for card in hand:
+                    child = node.children[card]
+                    value = (child.reward / child.visits +
+                             exploration * math.sqrt(math.log(child.avail) / child.visits))
+                    child.avail += 1
+                    if value > best_value:
+                        best, best_value = child, value
+                node = best
+                position.play(node.move)
+            # Expansion
+            if not position.is_over():
+                card = untried[int(rnd.random() * len(untried))]
+                child = _Node(card, position.to_move % 2, node)
+                node.children[card] = child
+                node = child
+                position.play(card)
+            # Playout and backpropagation
+            position.play_random(rnd)
+            while node is not root:
+                node.visits += 1
+                node.reward += position.margin(node.team_id)
+                node = node.parent
+        best = max(root.children.values(), key=lambda child: child.visits)
+        return best.move
@@ -0,0 +1,277 @@
+from gym import spaces
+
+from briscola_gym.envs.briscola_game import Game, NUM_CARDS, MAX_TEAM_POINTS, hand_slot
+from briscola_gym.envs.briscola_vec_game import VecGame, HAND_SIZE
+
+import numpy as np
+
+
+def _agent_name(seat):
+    return 'player_{}'.format(seat)
+
+
+def _observation_space(num_players, observation_mode='seat'):
+    if observation_mode == 'seat':
+        # (hand cards, briscola, field cards by seat, ..., deck size, current player,
+        #  played flag of every card)
+        shape = (HAND_SIZE + 1 + num_players + 2 + NUM_CARDS,)
+        high = NUM_CARDS
+    else:
+        # (hand cards, briscola, field cards by seat counting from the observer,
+        #  ..., deck size, cards on the field, seat holding the trick counting
+        #  from the observer plus one (0 for none), own and opponents team
+        #  points, played flag of every card)
+        shape = (HAND_SIZE + 1 + num_players + 5 + NUM_CARDS,)
+        high = MAX_TEAM_POINTS
+    return spaces.Dict({
+        'observation': spaces.Box(low=0, high=high, shape=shape, dtype=np.int8),
+        'action_mask': spaces.MultiBinary(HAND_SIZE),
+    })
+
+
+class BriscolaAECEnv(object):
+    """Turn based multi-agent Briscola following the PettingZoo AEC API.
+
+    Agents are named 'player_<seat>' and move in turn: `agent_selection` is
+    the agent to act, `last()` returns its observation, cumulative reward,
+    termination, truncation and info, and `step(action)` plays the hand slot
+    `action` for it. Observations use the `BriscolaEnv` 'seat' layout from
+    the point of view of the observing agent, with the mask of the hand slots
+    holding a card. The agents of the team winning a trick are rewarded with
+    its points. When the last trick is resolved every agent is terminated and
+    must be stepped once more with `None` to leave `agents`.
+
+    The arrays returned by `observe` are reused by the next call for the
+    same agent, copy them if they have to outlive it.
+    """
+    metadata = {'render.modes': ['human'], 'name': 'briscola_v0'}
+
+    def __init__(self, num_players=2, seed=None):
+        super(BriscolaAECEnv, self).__init__()
+        self.num_players = num_players
+        self.game = Game(num_players=num_players, init_game=False,
+                         seed=np.random.default_rng(seed))
+        self.possible_agents = [_agent_name(seat) for seat in range(num_players)]
+        self.agent_name_mapping = {agent: seat for seat, agent in enumerate(self.possible_agents)}
+        self._observation_space = _observation_space(num_players)
+        self._action_space = spaces.Discrete(HAND_SIZE)
+        self.obs_shape = self._observation_space['observation'].shape[0]
+        # Everything but the hand is shared by all the agents observations
+        self._public = np.zeros((self.obs_shape - HAND_SIZE,), dtype=np.int8)
+        self._deck_size_offset = 1 + num_players
+        self._played_offset = self._deck_size_offset + 2
+        self._obs = np.zeros((num_players, self.obs_shape), dtype=np.int8)
+        self._action_mask = np.zeros((num_players, HAND_SIZE), dtype=np.int8)
+        self._slots = np.arange(HAND_SIZE)
+        self.agents = []
+        self.rewards = {}
+        self._cumulative_rewards = {}
+        self.terminations = {}
+        self.truncations = {}
+        self.infos = {}
+        self.agent_selection = None
+
+    def observation_space(self, agent):
+        return self._observation_space
+
+    def action_space(self, agent):
+        return self._action_space
+
+    def seed(self, seed=None):
+        self.game.seed(np.random.default_rng(seed))
+        return [seed]
+
+    def reset(self, seed=None, options=None):
+        if seed is not None:
+            self.seed(seed)
+        game = self.game
+        game.reset()
+        game.init_game()
+        public = self._public
+        public[:] = 0
+        public[0] = game.deck.briscola_ref_id
+        public[self._deck_size_offset] = len(game.deck)
+        self.agents = self.possible_agents[:]
+        self.rewards = {agent: 0 for agent in self.agents}
+        self._cumulative_rewards = {agent: 0 for agent in self.agents}
+        self.terminations = {agent: False for agent in self.agents}
+        self.truncations = {agent: False for agent in self.agents}
+        self.infos = {agent: {} for agent in self.agents}
+        self.agent_selection = self.agents[0]
+
+    def observe(self, agent):
+        seat = self.agent_name_mapping[agent]
+        obs = self._obs[seat]
+        card_ids = self.game.players[seat].hand.card_ids
+        obs[:HAND_SIZE] = 0
+        obs[:len(card_ids)] = card_ids
+        obs[HAND_SIZE:] = self._public
+        mask = self._action_mask[seat]
+        mask[:] = self._slots < len(card_ids)
+        return {'observation': obs, 'action_mask': mask}
+
+    def last(self, observe=True):
+        agent = self.agent_selection
+        obs = self.observe(agent) if observe else None
+        return (obs, self._cumulative_rewards[agent], self.terminations[agent],
+                self.truncations[agent], self.infos[agent])
+
+    def agent_iter(self, max_iter=2 ** 63):
+        for _ in range(max_iter):
+            if not self.agents:
+                return
+            yield self.agent_selection
+
+    def _dead_step(self, agent):
+        self.agents.remove(agent)
+        for values in (self.rewards, self._cumulative_rewards, self.terminations,
+                       self.truncations, self.infos):
+            del values[agent]
+        if self.agents:
+            self.agent_selection = self.agents[0]
+
+    def step(self, action):
+        agent = self.agent_selection
+        if self.terminations[agent] or self.truncations[agent]:
+            self._dead_step(agent)
+            return
+        game = self.game
+        num_players = self.num_players
+        seat = self.agent_name_mapping[agent]
+        self._cumulative_rewards[agent] = 0
+        for other in self.agents:
+            self.rewards[other] = 0
+        hand = game.players[seat].hand
+        index = hand_slot(action, hand.size)
+        card_id = hand.card_ids[index]
+        game.player_play_card(seat, index)
+        public = self._public
+        public[1 + seat] = card_id
+        public[self._played_offset + card_id - 1] = 1
+        if len(game.field.get_cards_and_ids()) < num_players:
+            seat = (seat + 1) % num_players
+        else:
+            points = game.field.get_score()
+            seat, team_id = game.resolve_step()
+            for other in self.agents:
+                if game.players[self.agent_name_mapping[other]].team_id == team_id:
+                    self.rewards[other] = points
+            public[1:self._deck_size_offset] = 0
+            public[self._deck_size_offset] = len(game.deck)
+            if game.players_hand_size() == 0:
+                for other in self.agents:
+                    self.terminations[other] = True
+        public[self._deck_size_offset + 1] = seat
+        self.agent_selection = self.possible_agents[seat]
+        for other in self.agents:
+            self._cumulative_rewards[other] += self.rewards[other]
+
+    def render(self, mode='human'):
+        print(self.game.teams_score)
+
+    def close(self):
+        pass
+
+
+class BriscolaMultiAgentVecEnv(object):
+    """Batch of multi-agent Briscola games, every seat played by the caller.
+
+    At any time each game waits for exactly one seat, so every step gathers
+    the pending decision of all the games in one inference batch: the
+    observations use the `BriscolaAECEnv` layout from the point of view of
+    the acting seat, given under 'seat' so that per-seat policies can split
+    the batch. Rewards are (num_envs, num_players), every seat of the team
+    winning a trick getting its points. Finished games are reset as in
+    `BriscolaVecEnv`, the final observation going to
+    `info['terminal_observation']`.
+
+    With four players, partners sit opposite each other (see `VecGame`).
+    `observation_mode='team'` makes the observations relative to the acting
+    seat: the field starts from its own card, the partner's being half way
+    round, and the seat holding the trick and the points of the two teams
+    are given from its side, so that one policy can play any seat.
+
+    The returned arrays are reused between calls, copy them if they have to
+    outlive the next step.
+    """
+    def __init__(self, num_envs, num_players=2, seed=None, observation_mode='seat'):
+        super(BriscolaMultiAgentVecEnv, self).__init__()
+        assert observation_mode in ('seat', 'team')
+        self.num_envs = num_envs
+        self.num_players = num_players
+        self.observation_mode = observation_mode
+        self.game = VecGame(num_envs, num_players=num_players, seed=seed)
+        self.possible_agents = [_agent_name(seat) for seat in range(num_players)]
+        self.observation_space = _observation_space(num_players, observation_mode)
+        self.action_space = spaces.Discrete(HAND_SIZE)
+        self.obs_shape = self.observation_space['observation'].shape[0]
+        self._field_offset = HAND_SIZE + 1
+        self._played_offset = self.obs_shape - NUM_CARDS
+        # Seats in the order seen from every seat
+        seats = np.arange(num_players)
+        self._rotation = (seats[:, None] + seats[None, :]) % num_players
+        self._obs = np.zeros((num_envs, self.obs_shape), dtype=np.int8)
+        self._action_mask = np.zeros((num_envs, HAND_SIZE), dtype=np.int8)
+        self._all = np.arange(num_envs)
+
+    def _next_observation(self):
+        game = self.game
+        seat = game.current_player
+        obs = self._obs
+        obs[:, :HAND_SIZE] = game.hands[self._all, seat]
+        obs[:, HAND_SIZE] = game.briscola_card
+        pos = self._field_offset + self.num_players
+        if self.observation_mode == 'seat':
+            obs[:, self._field_offset:pos] = game.field
+            obs[:, pos] = game.deck_size
+            obs[:, pos + 1] = seat
+            return obs
+        obs[:, self._field_offset:pos] = game.field[self._all[:, None], self._rotation[seat]]
+        obs[:, pos] = game.deck_size
+        obs[:, pos + 1] = game.num_played
+        winner = game.trick_winner()
+        obs[:, pos + 2] = np.where(winner < 0, 0, (winner - seat) % self.num_players + 1)
+        team = game.seat_team[seat]
+        obs[:, pos + 3] = game.teams_score[self._all, team]
+        obs[:, pos + 4] = game.teams_score[self._all, 1 - team]
+        return obs
+
+    def _output(self):
+        return {'observation': self._next_observation(),
+                'action_mask': self.game.action_mask(out=self._action_mask),
+                'seat': self.game.current_player}
+
+    def seed(self, seed=None):
+        self.game.seed(seed)
+        return [seed]
+
+    def reset(self, seed=None, decks=None):
+        """Start new games, dealt from `decks` (one row of card ids per game
+        in `Game.deck_order` draw order) when given."""
+        if seed is not None:
+            self.game.seed(seed)
+        if decks is None:
+            self.game.reset()
+        else:
+            self.game.deal(decks)
+        self._obs[:, self._played_offset:] = 0
+        return self._output()
+
+    def step(self, actions, games=None):
+        """Play `actions[g]` for the seat acting in every game `g`, or in the
+        games `games` only (an index array matching `actions`)."""
+        game = self.game
+        rewards, dones = game.step(np.asarray(actions), games)
+        if games is None:
+            games = self._all
+        self._obs[games, self._played_offset - 1 + game.last_card[games]] = 1
+        info = {}
+        if dones.any():
+            done_index = np.flatnonzero(dones)
+            info['terminal_observation'] = self._next_observation()[done_index]
+            game.reset(done_index)
+            self._obs[done_index, self._played_offset:] = 0
+        return self._output(), rewards, dones, info
+
+    def close(self):
+        pass
@@ -0,0 +1,187 @@
+import multiprocessing as mp
+
+from gym import spaces
+
+from briscola_gym.envs.briscola_env import BriscolaEnv
+
+import numpy as np
+
+
+def _shared_array(ctx, shape, dtype):
+    dtype = np.dtype(dtype)
+    raw = ctx.RawArray('b', int(np.prod(shape)) * dtype.itemsize)
+    return raw, np.frombuffer(raw, dtype=dtype).reshape(shape)
+
+
+def _worker(remote, parent_remote, num_players, start, stop, buffers, seeds):
+    parent_remote.close()
+    obs_buf, terminal_buf, mask_buf, reward_buf, done_buf, action_buf = [
+        np.frombuffer(raw, dtype=dtype).reshape(shape)[start:stop]
+        for raw, dtype, shape in buffers]
+    envs = [BriscolaEnv(num_players=num_players, info_mode='none')
+            for _ in range(stop - start)]
+    for env, seed in zip(envs, seeds):
+        env.seed(seed)
+    try:
+        while True:
+            cmd = remote.recv()
+            if cmd == 'step':
+                for i, env in enumerate(envs):
+                    obs, reward, done, _ = env.step(action_buf[i])
+                    if done:
+                        terminal_buf[i] = obs
+                        obs = env.reset()
+                    obs_buf[i] = obs
+                    mask_buf[i] = env.action_mask()
+                    reward_buf[i] = reward
+                    done_buf[i] = done
+                remote.send(None)
+            elif isinstance(cmd, tuple) and cmd[0] == 'seed':
+                for env, seed in zip(envs, cmd[1]):
+                    env.seed(seed)
+                remote.send(None)
+            elif cmd == 'reset':
+                for i, env in enumerate(envs):
+                    obs_buf[i] = env.reset()
+                    mask_buf[i] = env.action_mask()
+                remote.send(None)
+            elif cmd == 'close':
+                break
+            else:
+                raise NotImplementedError(cmd)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        remote.close()
+
+
+class ParallelBriscolaEnv(object):
+    """Pool of `BriscolaEnv` sharded across worker processes.
+
+    Workers write observations, rewards and dones straight into shared memory
+    buffers, only a short command and its acknowledgement travel through the
+    pipes. Every environment gets its own random stream, spawned from `seed`.
+    Finished games are reset by the workers with `BriscolaEnv.reset`,
+    the final observation is then available in `info['terminal_observation']`.
+
+    With `action_mask=True` observations are dicts of the stacked observations
+    under 'observation' and the (num_envs, HAND_SIZE) action masks under
+    'action_mask', also written by the workers.
+
+    The returned arrays are views of the shared buffers and are overwritten
+    by the next step, copy them if they have to outlive it.
+    """
+    def __init__(self, num_envs, num_workers=None, num_players=2, seed=None,
+                 start_method=None, action_mask=False):
+        super(ParallelBriscolaEnv, self).__init__()
+        if num_workers is None:
+            num_workers = mp.cpu_count()
+        num_workers = min(num_workers, num_envs)
+        self.num_envs = num_envs
+        self.num_players = num_players
+        self.num_workers = num_workers
+        # Spaces and observation layout are the ones of a single BriscolaEnv
+        env = BriscolaEnv(num_players=num_players)
+        obs = env.reset()
+        self.action_space = env.action_space
+        self.observation_space = env.observation_space
+        self.obs_shape = obs.shape[0]
+        ctx = mp.get_context(start_method)
+        specs = [
+            ((num_envs, self.obs_shape), obs.dtype),
+            ((num_envs, self.obs_shape), obs.dtype),
+            ((num_envs, env.action_space.n), np.int8),
+            ((num_envs, num_players), np.float64),
+            ((num_envs,), np.bool_),
+            ((num_envs,), np.int64),
+        ]
+        buffers = []
+        arrays = []
+        for shape, dtype in specs:
+            raw, array = _shared_array(ctx, shape, dtype)
+            buffers.append((raw, dtype, shape))
+            arrays.append(array)
+        (self._obs, self._terminal_obs, self._action_mask, self._rewards, self._dones,
+         self._actions) = arrays
+        self._use_action_mask = action_mask
+        if action_mask:
+            self.observation_space = spaces.Dict({
+                'observation': self.observation_space,
+                'action_mask': spaces.MultiBinary(env.action_space.n),
+            })
+        self._remotes = []
+        self._processes = []
+        self._bounds = np.linspace(0, num_envs, num_workers + 1).astype(int)
+        seeds = self._spawn_seeds(seed)
+        for start, stop in zip(self._bounds[:-1], self._bounds[1:]):
+            remote, work_remote = ctx.Pipe()
+            process = ctx.Process(
+                target=_worker,
+                args=(work_remote, remote, num_players, start, stop, buffers,
+                      seeds[start:stop]),
+                daemon=True)
+            process.start()
+            work_remote.close()
+            self._remotes.append(remote)
+            self._processes.append(process)
+        self._waiting = False
+        self._closed = False
+
+    def _spawn_seeds(self, seed):
+        return np.random.SeedSequence(seed).spawn(self.num_envs)
+
+    def seed(self, seed=None):
+        seeds = self._spawn_seeds(seed)
+        for remote, start, stop in zip(self._remotes, self._bounds[:-1], self._bounds[1:]):
+            remote.send(('seed', seeds[start:stop]))
+        self._wait()
+        return [seed]
+
+    def _wait(self):
+        for remote in self._remotes:
+            remote.recv()
+
+    def action_mask(self):
+        return self._action_mask
+
+    def _output(self):
+        if self._use_action_mask:
+            return {'observation': self._obs, 'action_mask': self._action_mask}
+        return self._obs
+
+    def reset(self, seed=None):
+        if seed is not None:
+            self.seed(seed)
+        for remote in self._remotes:
+            remote.send('reset')
+        self._wait()
+        return self._output()
+
+    def step_async(self, actions):
+        self._actions[:] = actions
+        for remote in self._remotes:
+            remote.send('step')
+        self._waiting = True
+
+    def step_wait(self):
+        self._wait()
+        self._waiting = False
+        info = {}
+        if self._dones.any():
+            info['terminal_observation'] = self._terminal_obs[self._dones]
+        return self._output(), self._rewards, self._dones, info
+
+    def step(self, actions):
+        self.step_async(actions)
+        return self.step_wait()
+
+    def close(self):
+        if self._closed:
+            return
+        if self._waiting:
+            self._wait()
+        for remote in self._remotes:
+            remote.send('close')
+        for process in self._processes:
+            process.join()
+        self._closed = True
@@ -0,0 +1,98 @@
+import contextlib
+import sys
+import time
+
+
+class PhaseStats(object):
+    """Number of calls and cumulative nanoseconds spent in every phase."""
+    def __init__(self):
+        super(PhaseStats, self).__init__()
+        self.calls = {}
+        self.time_ns = {}
+
+    def add(self, phase, elapsed_ns):
+        self.calls[phase] = self.calls.get(phase, 0) + 1
+        self.time_ns[phase] = self.time_ns.get(phase, 0) + elapsed_ns
+
+    def reset(self):
+        self.calls.clear()
+        self.time_ns.clear()
+
+    def as_dict(self):
+        return {phase: {'calls': calls, 'time_ns': self.time_ns[phase]}
+                for phase, calls in self.calls.items()}
+
+    def report(self):
+        """Return a table of the phases, the slowest first. Phases are
+        nested (e.g. 'step' includes 'take_action'), so times do not add up."""
+        lines = ['{:<20} {:>10} {:>12} {:>12}'.format('phase', 'calls', 'total ms', 'ns/call')]
+        for phase in sorted(self.calls, key=self.time_ns.get, reverse=True):
+            calls, time_ns = self.calls[phase], self.time_ns[phase]
+            lines.append('{:<20} {:>10} {:>12.2f} {:>12.0f}'.format(
+                phase, calls, time_ns / 1e6, time_ns / calls))
+        return '\n'.join(lines)
+
+
+def _timed(stats, phase, func):
+    perf_counter_ns = time.perf_counter_ns
+
+    def timed(*args, **kwargs):
+        start = perf_counter_ns()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            stats.add(phase, perf_counter_ns() - start)
+    return timed
+
+
+def instrument(obj, phases, stats):
+    """Time the methods of `obj` mapped to phase names in `phases`.
+
+    The timed wrappers are set as instance attributes shadowing the methods,
+    so an object that is not instrumented runs the plain methods at no cost.
+    """
+    for name, phase in phases.items():
+        setattr(obj, name, _timed(stats, phase, getattr(type(obj), name).__get__(obj)))
+
+
+def uninstrument(obj, phases):
+    for name in phases:
+        obj.__dict__.pop(name, None)
+
+
+@contextlib.contextmanager
+def profile(env, file=None):
+    """Profile `env` (a `BriscolaEnv` or a `Game`) for the duration of the
+    block, yielding its `PhaseStats`, and print the breakdown at exit."""
+    stats = env.enable_profiling()
+    try:
+        yield stats
+    finally:
+        env.disable_profiling()
+        print(stats.report(), file=file if file is not None else sys.stdout)
+
+
+def print_event(event, data):
+    """Event handler printing the events in the legacy verbose format."""
+    from briscola_gym.envs.briscola_game import Card, HAND_SIZE
+    if event == 'trick':
+        for card_id, player_id, team_id in data['cards']:
+            print('{} giocata da giocatore {} in team {}'.format(
+                Card.from_id(card_id), player_id, team_id))
+        print('Vince giocatore {} con {} punti (briscola: {})'.format(
+            data['winner'], data['score'], data['briscola']))
+    elif event == 'game_over':
+        print('Vince il team {} con {} punti.'.format(data['team'], data['score']))
+    elif event == 'observation':
+        obs = data['observation']
+        # Hands, briscola, field, deck size and current player
+        num_players = (len(obs) - 3) // (HAND_SIZE + 1)
+        for i in range(num_players):
+            print('Player {} hand cards: {}'.format(i, obs[i * HAND_SIZE:(i + 1) * HAND_SIZE]))
+        print('Field_cards: ', obs[HAND_SIZE * num_players + 1:-2])
+    elif event == 'step':
+        print('-' * 80)
+        print('Observation: ', data['observation'])
+        print('Reward {} by playing card {}'.format(data['reward'], data['action']))
+    else:
+        print(event, data)
@@ -0,0 +1,198 @@
+import itertools
+import math
+import multiprocessing as mp
+
+from briscola_gym.envs.briscola_game import NUM_CARDS
+from briscola_gym.envs.briscola_mcts import MAX_POINTS
+from briscola_gym.envs.briscola_multiagent import BriscolaMultiAgentVecEnv
+from briscola_gym.envs.briscola_vec_game import shuffle_decks
+
+import numpy as np
+
+DRAW_POINTS = MAX_POINTS // 2
+
+
+class RandomPolicy(object):
+    """Batched policy playing a uniformly random card of the hand."""
+    def __init__(self, seed=None):
+        super(RandomPolicy, self).__init__()
+        self._rng = np.random.default_rng(seed)
+
+    def __call__(self, observations, action_masks):
+        sizes = action_masks.sum(axis=1)
+        return (self._rng.random(len(sizes)) * sizes).astype(np.int8)
+
+
+def play_match(policy_a, policy_b, num_deals=256, num_players=2, seed=None,
+               observation_mode='seat'):
+    """Play `num_deals` paired deals between two batched policies.
+
+    Every deck is played twice with the teams swapped, all the games of the
+    match advancing together. Policies are called as `policy(observations,
+    action_masks)` with the rows of the games where they are to move, in the
+    `BriscolaMultiAgentVecEnv` `observation_mode` layout, and return the hand
+    slots to play.
+    Team 0 holds the even seats. Returns a dict with the number of 'games',
+    the 'wins', 'draws' and 'losses' of `policy_a`, its total 'points' and
+    'pair_scores', the mean score (1 win, 0.5 draw) of every deal.
+    """
+    decks = shuffle_decks(np.random.default_rng(seed), num_deals)
+    env = BriscolaMultiAgentVecEnv(2 * num_deals, num_players=num_players,
+                                   observation_mode=observation_mode)
+    obs = env.reset(decks=np.concatenate([decks, decks]))
+    # Team 0 is played by policy_a in the first half of the games
+    a_team = np.repeat(np.array([0, 1], dtype=np.int8), num_deals)
+    points = np.zeros((2 * num_deals, 2))
+    for _ in range(NUM_CARDS):
+        by_a = obs['seat'] % 2 == a_team
+        actions = np.empty(2 * num_deals, dtype=np.int64)
+        for policy, rows in ((policy_a, by_a), (policy_b, ~by_a)):
+            if rows.any():
+                actions[rows] = policy(obs['observation'][rows], obs['action_mask'][rows])
+        obs, rewards, _, _ = env.step(actions)
+        points += rewards[:, :2]
+    a_points = points[np.arange(2 * num_deals), a_team]
+    scores = (a_points > DRAW_POINTS) + 0.5 * (a_points == DRAW_POINTS)
+    return {
+        'games': 2 * num_deals,
+        'wins': int((a_points > DRAW_POINTS).sum()),
+        'draws': int((a_points == DRAW_POINTS).sum()),
+        'losses': int((a_points < DRAW_POINTS).sum()),
+        'points': int(a_points.sum()),
+        'pair_scores': scores.reshape(2, num_deals).mean(axis=0),
+    }
+
+
+class RatingTable(object):
+    """Ratings of a set of players from streamed match results.
+
+    Results are accumulated per pair of players; `ratings` fits a
+    Bradley-Terry model on them and reports Elo-scaled ratings (mean
+    `initial`) with a confidence interval. The interval comes from the
+    variance of the per-deal paired scores, so it shrinks as fast as the
+    paired deals reduce the variance of the results.
+    """
+    def __init__(self, names, initial=1500., z=1.96):
+        super(RatingTable, self).__init__()
+        self.names = list(names)
+        self.initial = initial
+        self.z = z
+        size = len(self.names)
+        self._index = {name: i for i, name in enumerate(self.names)}
+        # Games and score of the row player against the column player, and
+        # the count, sum and sum of squares of their paired deal scores
+        self._games = np.zeros((size, size))
+        self._score = np.zeros((size, size))
+        self._pairs = np.zeros((size, size))
+        self._pair_sum = np.zeros((size, size))
+        self._pair_sq = np.zeros((size, size))
+
+    def update(self, name_a, name_b, result):
+        a, b = self._index[name_a], self._index[name_b]
+        pair_scores = np.asarray(result['pair_scores'])
+        score = result['wins'] + 0.5 * result['draws']
+        for i, j, s, pairs in ((a, b, score, pair_scores), (b, a, result['games'] - score,
+                                                             1 - pair_scores)):
+            self._games[i, j] += result['games']
+            self._score[i, j] += s
+            self._pairs[i, j] += len(pairs)
+            self._pair_sum[i, j] += pairs.sum()
+            self._pair_sq[i, j] += (pairs ** 2).sum()
+
+    def ratings(self, iterations=200):
+        """Return rows of (name, rating, low, high, games, score), the best
+        rated first."""
+        # One virtual draw per pair that played keeps the fit finite
+        played = self._games > 0
+        games = self._games + played
+        score = self._score + 0.5 * played
+        strength = np.ones(len(self.names))
+        total = score.sum(axis=1)
+        for _ in range(iterations):
+            denom = (games / (strength[:, None] + strength[None, :])).sum(axis=1)
+            strength = np.where(denom > 0, total / np.maximum(denom, 1e-12), strength)
+            strength /= np.exp(np.log(strength).mean())
+        logit = np.log(strength)
+        # Information on every rating from the paired score of each opponent
+        pairs = np.maximum(self._pairs, 1)
+        mean = (self._pair_sum + 0.5) / (pairs + 1)
+        var = np.maximum(self._pair_sq / pairs - (self._pair_sum / pairs) ** 2, 1e-3) / pairs
+        info = np.where(played, (mean * (1 - mean)) ** 2 / var, 0.).sum(axis=1)
+        scale = 400 / math.log(10)
+        rows = []
+        for i, name in enumerate(self.names):
+            rating = self.initial + scale * logit[i]
+            half = self.z * scale / math.sqrt(info[i]) if info[i] > 0 else math.inf
+            num_games = self._games[i].sum()
+            rows.append((name, rating, rating - half, rating + half, int(num_games),
+                         self._score[i].sum() / num_games if num_games else 0.))
+        rows.sort(key=lambda row: row[1], reverse=True)
+        return rows
+
+    def __str__(self):
+        lines = ['{:<20} {:>8} {:>17} {:>8} {:>6}'.format(
+            'policy', 'rating', 'interval', 'games', 'score')]
+        for name, rating, low, high, games, score in self.ratings():
+            lines.append('{:<20} {:>8.1f} {:>8.1f}-{:<8.1f} {:>8} {:>6.3f}'.format(
+                name, rating, low, high, games, score))
+        return '\n'.join(lines)
+
+
+_POLICIES = None
+
+
+def _init_worker(policies):
+    global _POLICIES
+    _POLICIES = policies
+
+
+def _run_match(task):
+    name_a, name_b, num_deals, num_players, observation_mode, seed = task
+    return name_a, name_b, play_match(_POLICIES[name_a], _POLICIES[name_b],
+                                      num_deals, num_players, seed, observation_mode)
+
+
+def iter_round_robin(policies, num_deals=1024, num_players=2, table=None,
+                     deals_per_task=256, num_workers=None, seed=None, start_method=None,
+                     observation_mode='seat'):
+    """Play `num_deals` paired deals between every pair of `policies` (a
+    dict of name to batched policy) and yield (name_a, name_b, result)
+    tuples as the matches finish, after adding them to `table`.
+
+    Matches are split in tasks of at most `deals_per_task` deals run on a
+    pool of `num_workers` processes (all the cores by default, in process
+    with 0); policies must then be picklable. They are given the observations
+    in the `observation_mode` layout.
+    """
+    tasks = []
+    for name_a, name_b in itertools.combinations(policies, 2):
+        for first in range(0, num_deals, deals_per_task):
+            tasks.append([name_a, name_b, min(deals_per_task, num_deals - first), num_players,
+                          observation_mode])
+    for task, task_seed in zip(tasks, np.random.SeedSequence(seed).spawn(len(tasks))):
+        task.append(task_seed)
+    if num_workers == 0:
+        _init_worker(policies)
+        results = map(_run_match, tasks)
+        pool = None
+    else:
+        pool = mp.get_context(start_method).Pool(num_workers, initializer=_init_worker,
+                                                 initargs=(policies,))
+        results = pool.imap_unordered(_run_match, tasks)
+    try:
+        for name_a, name_b, result in results:
+            if table is not None:
+                table.update(name_a, name_b, result)
+            yield name_a, name_b, result
+    finally:
+        if pool is not None:
+            pool.terminate()
+
+
+def round_robin(policies, num_deals=1024, num_players=2, **kwargs):
+    """Play a round robin tournament, see `iter_round_robin`, and return
+    its `RatingTable`."""
+    table = RatingTable(policies)
+    for _ in iter_round_robin(policies, num_deals, num_players, table=table, **kwargs):
+        pass
+    return table
@@ -0,0 +1,234 @@
+import os
+
+from briscola_gym.envs.briscola_game import NUM_CARDS, HAND_SIZE, hand_slot
+from briscola_gym.envs.briscola_vec_env import BriscolaVecEnv
+from briscola_gym.envs.briscola_vec_game import replay_games
+
+import numpy as np
+
+MAGIC = b'BRISCTRJ'
+VERSION = 1
+# File header, followed by one fixed-size record per game
+HEADER_DTYPE = np.dtype([('magic', 'S8'), ('version', '<u4'), ('num_players', '<u4'),
+                         ('num_games', '<u8')])
+# The deck in `Game.deck_order` draw order and the card ids played by all
+# the seats, in order
+RECORD_DTYPE = np.dtype([('deck', 'u1', (NUM_CARDS,)), ('num_actions', 'u1'),
+                         ('actions', 'u1', (NUM_CARDS,))])
+
+
+def _read_header(f):
+    f.seek(0)
+    data = f.read(HEADER_DTYPE.itemsize)
+    if len(data) < HEADER_DTYPE.itemsize:
+        raise ValueError('Not a trajectory file: {}'.format(f.name))
+    header = np.frombuffer(data, dtype=HEADER_DTYPE)[0]
+    if header['magic'] != MAGIC or header['version'] != VERSION:
+        raise ValueError('Not a trajectory file: {}'.format(f.name))
+    return header
+
+
+class TrajectoryWriter(object):
+    """Append games to a trajectory file, `chunk_size` records at a time.
+
+    Records have a fixed size, so game `i` is found at a computed offset and
+    the game count of the header acts as the index. The count is rewritten
+    only after a chunk is written: a chunk left incomplete by a crash is
+    ignored by readers and overwritten by the next writer.
+    """
+    def __init__(self, path, num_players=2, chunk_size=4096):
+        super(TrajectoryWriter, self).__init__()
+        self.path = path
+        self.num_players = num_players
+        self.chunk_size = chunk_size
+        self._chunk = np.zeros(chunk_size, dtype=RECORD_DTYPE)
+        self._pending = 0
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            self._file = open(path, 'r+b')
+            header = _read_header(self._file)
+            assert header['num_players'] == num_players, \
+                'The file holds {} players games.'.format(header['num_players'])
+            self._num_games = int(header['num_games'])
+        else:
+            self._file = open(path, 'w+b')
+            self._num_games = 0
+            self._write_header()
+
+    def __len__(self):
+        return self._num_games + self._pending
+
+    def _write_header(self):
+        header = np.zeros((), dtype=HEADER_DTYPE)
+        header['magic'] = MAGIC
+        header['version'] = VERSION
+        header['num_players'] = self.num_players
+        header['num_games'] = self._num_games
+        self._file.seek(0)
+        self._file.write(header.tobytes())
+
+    def append(self, deck_order, actions):
+        """Add a game given its deck order and the card ids played."""
+        i = self._pending
+        self._chunk['deck'][i] = deck_order
+        self._chunk['num_actions'][i] = len(actions)
+        self._chunk['actions'][i] = 0
+        self._chunk['actions'][i, :len(actions)] = actions
+        self._pending += 1
+        if self._pending == self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        if self._pending == 0:
+            return
+        f = self._file
+        f.seek(HEADER_DTYPE.itemsize + self._num_games * RECORD_DTYPE.itemsize)
+        f.write(self._chunk[:self._pending].tobytes())
+        f.flush()
+        self._num_games += self._pending
+        self._pending = 0
+        self._write_header()
+        f.flush()
+
+    def close(self):
+        if self._file.closed:
+            return
+        self.flush()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class TrajectoryRecorder(object):
+    """Wrap a `BriscolaEnv` to write every game it plays to `writer`, a
+    `TrajectoryWriter` or a path.
+
+    Only the deck order and the card ids played by every seat, opponent
+    included, are stored. A game is written when it ends, or when the
+    environment is reset or closed before that. Other attributes are looked
+    up on the wrapped environment.
+    """
+    def __init__(self, env, writer, chunk_size=4096):
+        super(TrajectoryRecorder, self).__init__()
+        self.env = env
+        if not isinstance(writer, TrajectoryWriter):
+            writer = TrajectoryWriter(writer, num_players=env.num_players,
+                                      chunk_size=chunk_size)
+        self.writer = writer
+        self._actions = []
+        self._opponent = env.opponent
+        if env.opponent is not None:
+            env.opponent = self._play_opponent
+
+    def __getattr__(self, name):
+        return getattr(self.env, name)
+
+    def _record(self, player_id, action):
+        hand = self.env.game.players[player_id].hand
+        if hand.size > 0:
+            self._actions.append(hand.card_ids[hand_slot(action, hand.size)])
+
+    def _play_opponent(self, game, player_id):
+        action = self._opponent(game, player_id)
+        self._record(player_id, action)
+        return action
+
+    def _write_game(self):
+        if self._actions:
+            self.writer.append(self.env.game.deck_order, self._actions)
+        self._actions = []
+
+    def reset(self, *args, **kwargs):
+        self._write_game()
+        return self.env.reset(*args, **kwargs)
+
+    def step(self, action, *args, **kwargs):
+        env = self.env
+        slot = env._card_to_slot(action) if env.action_mode == 'card' else action
+        self._record(env.current_player, slot)
+        obs, reward, done, info = env.step(action, *args, **kwargs)
+        if done:
+            self._write_game()
+        return obs, reward, done, info
+
+    def close(self):
+        self._write_game()
+        self.writer.close()
+        self.env.close()
+
+
+class TrajectoryReader(object):
+    """Memory-mapped, read-only view of a trajectory file.
+
+    Indexing returns the raw records; `iter_batches` re-simulates the games
+    on demand, a batch at a time, so files larger than memory can be read.
+    """
+    def __init__(self, path):
+        super(TrajectoryReader, self).__init__()
+        self.path = path
+        with open(path, 'rb') as f:
+            header = _read_header(f)
+        self.num_players = int(header['num_players'])
+        num_games = int(header['num_games'])
+        if num_games > 0:
+            self._records = np.memmap(path, dtype=RECORD_DTYPE, mode='r',
+                                      offset=HEADER_DTYPE.itemsize, shape=(num_games,))
+        else:
+            self._records = np.zeros(0, dtype=RECORD_DTYPE)
+
+    def __len__(self):
+        return len(self._records)
+
+    def __getitem__(self, index):
+        return self._records[index]
+
+    def replay(self, index, upto=None):
+        """Return a `VecGame` with the positions of the games `index` after
+        `upto` moves, the end of the recorded games by default."""
+        records = self._records[index]
+        if upto is None:
+            upto = records['num_actions']
+        return replay_games(records['deck'], records['actions'], upto, self.num_players)
+
+    def iter_batches(self, batch_games=1024, start=0, stop=None):
+        """Yield the transitions of `batch_games` games at a time, game by
+        game and move by move, as a dict of 'observation' (B, obs_shape) in
+        the `BriscolaVecEnv` layout, 'action' (B,) hand slots, 'reward'
+        (B, num_players) rewards of the tricks resolved by the move,
+        'action_mask' (B, HAND_SIZE) and 'done' (B,)."""
+        if stop is None:
+            stop = len(self)
+        env = None
+        for first in range(start, stop, batch_games):
+            records = self._records[first:min(first + batch_games, stop)]
+            num_games = len(records)
+            if env is None or env.num_envs != num_games:
+                env = BriscolaVecEnv(num_games, num_players=self.num_players)
+            game = env.game
+            game.deal(records['deck'])
+            played = records['actions']
+            obs = np.empty((num_games, NUM_CARDS, env.obs_shape), dtype=np.int8)
+            actions = np.empty((num_games, NUM_CARDS), dtype=np.int8)
+            rewards = np.empty((num_games, NUM_CARDS, self.num_players), dtype=np.float32)
+            masks = np.empty((num_games, NUM_CARDS, HAND_SIZE), dtype=np.int8)
+            dones = np.empty((num_games, NUM_CARDS), dtype=np.bool_)
+            valid = np.arange(NUM_CARDS) < records['num_actions'][:, None]
+            for t in range(NUM_CARDS):
+                obs[:, t] = env._next_observation()
+                masks[:, t] = env.action_mask()
+                slots = game.card_slots(played[:, t])
+                if (slots[valid[:, t]] < 0).any():
+                    raise ValueError('Corrupt trajectory records in games {}-{}.'.format(
+                        first, first + num_games - 1))
+                actions[:, t] = slots
+                rewards[:, t], dones[:, t] = game.step(actions[:, t])
+            yield {
+                'observation': obs[valid],
+                'action': actions[valid],
+                'reward': rewards[valid],
+                'action_mask': masks[valid],
+                'done': dones[valid],
+            }
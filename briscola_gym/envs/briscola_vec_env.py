@@ -0,0 +1,81 @@
+from gym import spaces
+
+from briscola_gym.envs.briscola_vec_game import VecGame, NUM_CARDS, HAND_SIZE
+
+import numpy as np
+
+
+class BriscolaVecEnv(object):
+    """Batch of independent Briscola games stepped with a single call.
+
+    Observations follow the `BriscolaEnv._next_observation` layout, one row
+    per game. Games are reset automatically as soon as their last trick is
+    resolved: the returned observation is then the one of the new game, while
+    the final one is available in `info['terminal_observation']`.
+
+    With `action_mask=True` observations are dicts of the stacked
+    observations under 'observation' and the (num_envs, HAND_SIZE) mask of
+    the hand slots holding a card under 'action_mask'.
+
+    The returned observation and reward arrays are reused between calls, copy
+    them if they have to outlive the next step.
+    """
+    def __init__(self, num_envs, num_players=2, seed=None, action_mask=False):
+        super(BriscolaVecEnv, self).__init__()
+        self.num_envs = num_envs
+        self.num_players = num_players
+        self.game = VecGame(num_envs, num_players=num_players, seed=seed)
+        self.action_space = spaces.Discrete(HAND_SIZE)
+        # (cards in hands, ..., briscola, field cards, ..., deck size, current player)
+        self.obs_shape = HAND_SIZE * num_players + 1 + num_players + 2
+        self.observation_space = spaces.Box(low=0, high=NUM_CARDS,
+                                            shape=(self.obs_shape,), dtype=np.int8)
+        self._obs = np.zeros((num_envs, self.obs_shape), dtype=np.int8)
+        self._action_mask = np.zeros((num_envs, HAND_SIZE), dtype=np.int8)
+        self._use_action_mask = action_mask
+        if action_mask:
+            self.observation_space = spaces.Dict({
+                'observation': self.observation_space,
+                'action_mask': spaces.MultiBinary(HAND_SIZE),
+            })
+
+    def _next_observation(self):
+        num_hand_cards = HAND_SIZE * self.num_players
+        obs = self._obs
+        obs[:, :num_hand_cards] = self.game.hands.reshape(self.num_envs, -1)
+        obs[:, num_hand_cards] = self.game.briscola_card
+        obs[:, num_hand_cards + 1:-2] = self.game.field
+        obs[:, -2] = self.game.deck_size
+        obs[:, -1] = self.game.current_player
+        return obs
+
+    def action_mask(self):
+        return self.game.action_mask(out=self._action_mask)
+
+    def _output(self):
+        obs = self._next_observation()
+        if self._use_action_mask:
+            return {'observation': obs, 'action_mask': self.action_mask()}
+        return obs
+
+    def seed(self, seed=None):
+        self.game.seed(seed)
+        return [seed]
+
+    def reset(self, seed=None):
+        if seed is not None:
+            self.game.seed(seed)
+        self.game.reset()
+        return self._output()
+
+    def step(self, actions):
+        rewards, dones = self.game.step(np.asarray(actions))
+        info = {}
+        if dones.any():
+            done_index = np.flatnonzero(dones)
+            info['terminal_observation'] = self._next_observation()[done_index]
+            self.game.reset(done_index)
+        return self._output(), rewards, dones, info
+
+    def close(self):
+        pass
@@ -0,0 +1,387 @@
+import numpy as np
+
+from briscola_gym.envs.briscola_game import NUM_CARDS, CARD_IDS, HAND_SIZE, hand_slot
+from briscola_gym.envs import briscola_game
+
+# Card lookup tables indexed by card id (zero is the Not-a-Card token)
+CARD_SUIT = np.array(briscola_game.CARD_SUIT, dtype=np.int8)
+CARD_VALUE = np.array(briscola_game.CARD_VALUE, dtype=np.int8)
+CARD_SCORE = np.array(briscola_game.CARD_SCORE, dtype=np.int8)
+# Trick tables indexed by [briscola suit, lead card, card] and [lead card, card]
+TRICK_WINNER = np.array(briscola_game.TRICK_WINNER, dtype=np.bool_).reshape(
+    -1, NUM_CARDS + 1, NUM_CARDS + 1)
+# Bit of every card in the played cards masks, card id `c` is bit `c - 1`
+CARD_BIT = np.array([0] + [1 << (card_id - 1) for card_id in CARD_IDS], dtype=np.uint64)
+TRICK_POINTS = np.array(briscola_game.TRICK_POINTS, dtype=np.int8).reshape(
+    NUM_CARDS + 1, NUM_CARDS + 1)
+
+
+def shuffle_decks(rng, num_decks):
+    """Return `num_decks` shuffled decks of card ids, one per row."""
+    decks = np.broadcast_to(np.array(CARD_IDS, dtype=np.int8),
+                            (num_decks, NUM_CARDS))
+    return rng.permuted(decks, axis=1)
+
+
+class VecGame(object):
+    """Briscola rules engine advancing many games at once.
+
+    The state of every game lives in struct-of-arrays form: row `g` of each
+    array belongs to game `g`. Decks are stored in draw order, with the
+    briscola card moved to the bottom so that it is the last card drawn.
+
+    Two players play one against the other, four players in two teams of
+    partners sitting opposite each other: seats 0 and 2 (team 0) against
+    seats 1 and 3 (team 1). Rewards are per seat, every seat of the team
+    winning a trick getting its points.
+    """
+    # Arrays holding the state of the games
+    _STATE = ('_deck', '_deck_pos', '_briscola_card', '_briscola_suit', '_hands',
+              '_hand_size', '_field', '_last_card', '_num_played', '_leader',
+              '_current_player', '_winner', '_winner_card', '_teams_score', '_num_tricks',
+              '_trick_winners', '_played_mask')
+
+    def __init__(self, num_games, num_players=2, seed=None):
+        super(VecGame, self).__init__()
+        assert num_players in (2, 4), 'Only 2 and 4 players games are supported.'
+        self._num_games = num_games
+        self._num_players = num_players
+        self._num_teams = 2
+        self._num_tricks_per_game = NUM_CARDS // num_players
+        self._rng = np.random.default_rng(seed)
+        self._all = np.arange(num_games)
+        self._row_base = self._all * num_players
+        self._slots = np.arange(HAND_SIZE)
+        self._next_seat = (np.arange(num_players, dtype=np.int8) + 1) % num_players
+        self._seat_team = np.arange(num_players) % self._num_teams
+        seats = np.arange(num_players, dtype=np.int8)
+        self._partner = (seats + 2) % num_players if num_players == 4 else seats
+        self._deck = np.zeros((num_games, NUM_CARDS), dtype=np.int8)
+        self._deck_pos = np.zeros(num_games, dtype=np.int8)
+        self._briscola_card = np.zeros(num_games, dtype=np.int8)
+        self._briscola_suit = np.zeros(num_games, dtype=np.int8)
+        self._hands = np.zeros((num_games, num_players, HAND_SIZE), dtype=np.int8)
+        self._hand_size = np.zeros((num_games, num_players), dtype=np.int8)
+        self._field = np.zeros((num_games, num_players), dtype=np.int8)
+        self._last_card = np.zeros(num_games, dtype=np.int8)
+        self._num_played = np.zeros(num_games, dtype=np.int8)
+        self._leader = np.zeros(num_games, dtype=np.int8)
+        self._current_player = np.zeros(num_games, dtype=np.int8)
+        # Seat and card holding the trick in progress
+        self._winner = np.zeros(num_games, dtype=np.int8)
+        self._winner_card = np.zeros(num_games, dtype=np.int8)
+        self._teams_score = np.zeros((num_games, self._num_teams), dtype=np.int16)
+        self._num_tricks = np.zeros(num_games, dtype=np.int8)
+        self._trick_winners = np.zeros((num_games, self._num_tricks_per_game), dtype=np.int8)
+        self._played_mask = np.zeros(num_games, dtype=np.uint64)
+        # Flat views indexed by `game * num_players + seat` (or card position)
+        self._deck_flat = self._deck.reshape(-1)
+        self._hands_rows = self._hands.reshape(-1, HAND_SIZE)
+        self._hand_size_rows = self._hand_size.reshape(-1)
+        self._field_rows = self._field.reshape(-1)
+        self._rewards = np.zeros((num_games, num_players), dtype=np.float32)
+        self.reset()
+
+    def seed(self, seed=None):
+        self._rng = np.random.default_rng(seed)
+
+    @property
+    def num_games(self):
+        return self._num_games
+
+    @property
+    def num_players(self):
+        return self._num_players
+
+    @property
+    def deck(self):
+        return self._deck
+
+    @property
+    def deck_size(self):
+        return NUM_CARDS - self._deck_pos
+
+    @property
+    def briscola_card(self):
+        return self._briscola_card
+
+    @property
+    def briscola_suit(self):
+        return self._briscola_suit
+
+    @property
+    def hands(self):
+        return self._hands
+
+    @property
+    def hand_size(self):
+        return self._hand_size
+
+    @property
+    def field(self):
+        return self._field
+
+    @property
+    def last_card(self):
+        """Card played in every game by the last step."""
+        return self._last_card
+
+    @property
+    def current_player(self):
+        return self._current_player
+
+    @property
+    def num_played(self):
+        """Cards on the field of every game."""
+        return self._num_played
+
+    @property
+    def leader(self):
+        return self._leader
+
+    @property
+    def seat_team(self):
+        """Team of every seat."""
+        return self._seat_team
+
+    @property
+    def partner(self):
+        """Partner of every seat, the seat itself with two players."""
+        return self._partner
+
+    @property
+    def teams_score(self):
+        return self._teams_score
+
+    @property
+    def num_tricks(self):
+        return self._num_tricks
+
+    @property
+    def trick_winners(self):
+        return self._trick_winners
+
+    @property
+    def played_mask(self):
+        """Bitmask of the cards played in every game, as in `Game.played_mask`."""
+        return self._played_mask
+
+    def reset(self, index=None):
+        if index is None:
+            index = self._all
+        if len(index) == 0:
+            return
+        self.deal(shuffle_decks(self._rng, len(index)), index)
+
+    def deal(self, decks, index=None):
+        """Start the games `index` (all by default) from `decks`, one row of
+        card ids per game in the `Game.deck_order` draw order."""
+        if index is None:
+            index = self._all
+        num_games = len(index)
+        num_dealt = HAND_SIZE * self._num_players
+        decks = np.array(decks, dtype=np.int8)
+        # The first card after dealing is the briscola and goes at the bottom
+        briscola = decks[:, num_dealt].copy()
+        decks[:, num_dealt:-1] = decks[:, num_dealt + 1:]
+        decks[:, -1] = briscola
+        self._deck[index] = decks
+        self._deck_pos[index] = num_dealt
+        self._briscola_card[index] = briscola
+        self._briscola_suit[index] = CARD_SUIT[briscola]
+        # Cards are dealt one at a time to each player, three rounds
+        self._hands[index] = decks[:, :num_dealt].reshape(
+            num_games, HAND_SIZE, self._num_players).transpose(0, 2, 1)
+        self._hand_size[index] = HAND_SIZE
+        self._field[index] = 0
+        self._num_played[index] = 0
+        self._leader[index] = 0
+        self._current_player[index] = 0
+        self._teams_score[index] = 0
+        self._num_tricks[index] = 0
+        self._trick_winners[index] = 0
+        self._played_mask[index] = 0
+
+    def _play(self, actions, games):
+        # Rows of the (num_games * num_players, ...) views of the current players
+        current = self._current_player[games]
+        row = self._row_base[games] + current
+        size = np.maximum(self._hand_size_rows[row], 1)
+        index = hand_slot(np.asarray(actions), size)
+        hand = self._hands_rows[row]
+        card = hand[self._all[:len(row)], index]
+        # Remove the played card shifting the following ones to the left
+        hand[:, 0] = np.where(index == 0, hand[:, 1], hand[:, 0])
+        hand[:, 1] = np.where(index <= 1, hand[:, 2], hand[:, 1])
+        hand[:, 2] = 0
+        self._hands_rows[row] = hand
+        self._hand_size_rows[row] -= 1
+        self._field_rows[row] = card
+        self._last_card[games] = card
+        # The lead card holds the trick until beaten
+        winner_card = self._winner_card[games]
+        beats = (self._num_played[games] == 0) | TRICK_WINNER[self._briscola_suit[games],
+                                                              winner_card, card]
+        self._winner[games] = np.where(beats, current, self._winner[games])
+        self._winner_card[games] = np.where(beats, card, winner_card)
+        self._played_mask[games] |= CARD_BIT[card]
+        self._num_played[games] += 1
+        self._current_player[games] = self._next_seat[current]
+
+    def trick_winner(self):
+        """Seat holding the trick in progress in every game, -1 where no
+        card has been played yet."""
+        return np.where(self._num_played > 0, self._winner, -1)
+
+    def _resolve(self, games):
+        num_players = self._num_players
+        row_base = self._row_base[games]
+        winner = self._winner[games]
+        field = self._field_rows
+        points = TRICK_POINTS[field[row_base], field[row_base + 1]].astype(np.int16)
+        if num_players == 4:
+            points += TRICK_POINTS[field[row_base + 2], field[row_base + 3]]
+        team = self._seat_team[winner]
+        self._teams_score[games, team] += points
+        self._rewards[games] = np.where(
+            self._seat_team[None, :] == team[:, None], points[:, None], 0)
+        # Each player draws a card, starting from the trick winner
+        can_draw = self._deck_pos[games] < NUM_CARDS
+        if can_draw.any():
+            draw_games = games[can_draw]
+            draw_rows = row_base[can_draw]
+            deck_index = draw_games * NUM_CARDS + self._deck_pos[draw_games]
+            seat = winner[can_draw]
+            for i in range(num_players):
+                row = draw_rows + seat
+                size = self._hand_size_rows[row]
+                self._hands_rows[row, size] = self._deck_flat[deck_index + i]
+                self._hand_size_rows[row] = size + 1
+                seat = self._next_seat[seat]
+            self._deck_pos[draw_games] += num_players
+        self._field[games] = 0
+        self._num_played[games] = 0
+        self._leader[games] = winner
+        self._current_player[games] = winner
+        self._trick_winners[games, self._num_tricks[games]] = winner
+        self._num_tricks[games] += 1
+
+    def action_mask(self, out=None):
+        """Return, for every game, which hand slots of the current player
+        hold a card."""
+        size = self._hand_size_rows[self._row_base + self._current_player]
+        if out is None:
+            out = np.empty((self._num_games, HAND_SIZE), dtype=np.int8)
+        out[:] = self._slots < size[:, None]
+        return out
+
+    def card_slots(self, cards):
+        """Hand slot of `cards[g]` for the current player of every game `g`,
+        -1 where the card is not in that hand."""
+        hand = self._hands_rows[self._row_base + self._current_player]
+        match = hand == np.asarray(cards)[:, None]
+        return np.where(match.any(axis=1), match.argmax(axis=1), -1)
+
+    def copy_games(self, src, index):
+        """Copy the state of the games `index` of the `VecGame` `src`."""
+        for name in self._STATE:
+            getattr(self, name)[index] = getattr(src, name)[index]
+
+    def random_actions(self):
+        """Uniformly random hand index for the current player of every game."""
+        size = self._hand_size_rows[self._row_base + self._current_player]
+        return (self._rng.random(self._num_games) * size).astype(np.int8)
+
+    def step(self, actions, games=None):
+        """Play `actions[g]` for the current player of every game `g`, or of
+        the games `games` only (an index array matching `actions`).
+
+        Returns the per-seat rewards of the tricks resolved by this step and
+        the games that ended with it.
+        """
+        self._rewards[:] = 0
+        self._play(actions, slice(None) if games is None else games)
+        resolve = np.flatnonzero(self._num_played == self._num_players)
+        if len(resolve) > 0:
+            self._resolve(resolve)
+        dones = self._num_tricks == self._num_tricks_per_game
+        return self._rewards, dones
+
+
+def replay_games(decks, actions, upto=None, num_players=2):
+    """Return a `VecGame` holding, for every recorded game `g`, the position
+    after the first `upto[g]` card ids of `actions[g]` have been played from
+    `decks[g]` (in `Game.deck_order` draw order). By default all the actions
+    are played."""
+    decks = np.asarray(decks)
+    actions = np.asarray(actions)
+    num_games = len(decks)
+    if upto is None:
+        upto = actions.shape[1]
+    upto = np.broadcast_to(upto, (num_games,))
+    game = VecGame(num_games, num_players=num_players)
+    game.deal(decks)
+    positions = VecGame(num_games, num_players=num_players)
+    positions.copy_games(game, np.flatnonzero(upto == 0))
+    for t in range(int(upto.max(initial=0))):
+        slots = game.card_slots(actions[:, t])
+        missing = (slots < 0) & (upto > t)
+        if missing.any():
+            raise ValueError('Card not in hand at move {} of games {}.'.format(
+                t, np.flatnonzero(missing)))
+        game.step(slots)
+        positions.copy_games(game, np.flatnonzero(upto == t + 1))
+    return positions
+
+
+def iter_simulate_games(n, num_players=2, policy='random', seed=None, chunk_size=1 << 16):
+    """Play `n` full games in batches of at most `chunk_size` games.
+
+    `policy` is either 'random' or a callable taking the `VecGame` and
+    returning the hand index to play for every game. Yields, for every chunk,
+    a dict with the final 'teams_score' (games, 2), the seat of the winner of
+    every trick 'trick_winners' (games, tricks) and the 'briscola_suit'.
+    """
+    if isinstance(policy, str):
+        if policy != 'random':
+            raise ValueError('Unknown policy {!r}.'.format(policy))
+    elif not callable(policy):
+        raise TypeError('policy must be \'random\' or a callable, not {!r}.'.format(policy))
+    return _simulate_chunks(n, num_players, policy, seed, chunk_size)
+
+
+def _simulate_chunks(n, num_players, policy, seed, chunk_size):
+    rng = np.random.default_rng(seed)
+    game = None
+    while n > 0:
+        num_games = min(n, chunk_size)
+        if game is None or game.num_games != num_games:
+            game = VecGame(num_games, num_players=num_players, seed=rng)
+        else:
+            game.reset()
+        for _ in range(NUM_CARDS):
+            if policy == 'random':
+                actions = game.random_actions()
+            else:
+                actions = policy(game)
+            game.step(actions)
+        yield {
+            'teams_score': game.teams_score.copy(),
+            'trick_winners': game.trick_winners.copy(),
+            'briscola_suit': game.briscola_suit.copy(),
+        }
+        n -= num_games
+
+
+def simulate_games(n, num_players=2, policy='random', seed=None, chunk_size=1 << 16):
+    """Play `n` full games and return their results concatenated, see
+    `iter_simulate_games` to stream them chunk by chunk instead."""
+    chunks = list(iter_simulate_games(n, num_players, policy, seed, chunk_size))
+    if not chunks:
+        return {
+            'teams_score': np.zeros((0, 2), dtype=np.int16),
+            'trick_winners': np.zeros((0, NUM_CARDS // num_players), dtype=np.int8),
+            'briscola_suit': np.zeros(0, dtype=np.int8),
+        }
+    return {key: np.concatenate([chunk[key] for chunk in chunks])
+            for key in ('teams_score', 'trick_winners', 'briscola_suit')}
@@ -3,5 +3,7 @@ from setuptools import setup
 setup(
     name='briscola_gym',
     version='0.0.1',
-    install_requires=['gym', 'numpy']  # And any other dependencies foo needs
+    install_requires=['gym', 'numpy'],  # And any other dependencies foo needs
+    # Lets gym register the environments without importing them
+    entry_points={'gym.envs': ['__root__ = briscola_gym:register_envs']},
 )
@@ -0,0 +1,77 @@
+import pytest
+
+from briscola_gym.envs.briscola_game import Game
+from briscola_gym.envs.briscola_endgame import EndgamePlayer, EndgameSolver
+
+
+def to_move(game):
+    return (game.last_winner_id + len(game.field.get_cards_and_ids())) % game.num_players
+
+
+def minimax(game):
+    """Final score margin of team 0 under optimal play, by brute force on
+    game clones."""
+    player_id = to_move(game)
+    if game.players[player_id].hand.size == 0:
+        return game.teams_score[0] - game.teams_score[1]
+    values = []
+    for i in range(game.players[player_id].hand.size):
+        child = game.clone()
+        child.player_play_card(player_id, i)
+        if len(child.field.get_cards_and_ids()) == game.num_players:
+            child.resolve_step()
+        values.append(minimax(child))
+    return max(values) if player_id % 2 == 0 else min(values)
+
+
+def endgame(num_players, seed):
+    """Random position after the deck ran out, with up to a trick played."""
+    game = Game(num_players=num_players, seed=seed)
+    while len(game.deck) > 0:
+        game.random_step()
+        game.resolve_step()
+    for _ in range(min(seed % (num_players + 1), num_players - 1)):
+        game.player_play_card(to_move(game), 0)
+    return game
+
+
+@pytest.mark.parametrize('num_players', [2, 4])
+def test_solver_matches_minimax(num_players):
+    solver = EndgameSolver()
+    for seed in range(175):
+        game = endgame(num_players, seed)
+        expected = minimax(game)
+        assert solver.value(game, 0) == expected
+        assert solver.value(game, 1) == -expected
+        card, margin = solver.solve(game)
+        assert card in game.players[to_move(game)].hand.card_ids
+        assert margin == (expected if to_move(game) % 2 == 0 else -expected)
+
+
+class RecordingPlayer(object):
+
+    def __init__(self):
+        super(RecordingPlayer, self).__init__()
+        self.calls = 0
+
+    def __call__(self, game, player_id):
+        self.calls += 1
+        return 0
+
+
+def test_player_uses_solver_only_with_two_players():
+    for num_players, calls in ((2, 0), (4, 1)):
+        fallback = RecordingPlayer()
+        player = EndgamePlayer(fallback=fallback)
+        game = endgame(num_players, 0)
+        player(game, to_move(game))
+        assert fallback.calls == calls
+
+
+def test_bounded_table_stays_exact():
+    solver = EndgameSolver(max_entries=64)
+    for seed in range(20):
+        game = endgame(4, seed)
+        assert solver.value(game, 0) == minimax(game)
+        assert len(solver.cache) <= 64
+    assert solver.cache.evictions > 0
@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+
+from briscola_gym.envs.briscola_env import BriscolaEnv
+from briscola_gym.envs.briscola_game import NUM_CARDS
+from briscola_gym.envs.briscola_vec_env import BriscolaVecEnv
+
+
+@pytest.mark.parametrize('num_players', [2, 4])
+def test_incremental_observation(num_players):
+    env = BriscolaEnv(num_players=num_players)
+    rng = np.random.default_rng(num_players)
+    full = np.zeros(env.obs_shape, dtype=np.int8)
+    for seed in range(30):
+        obs = env.reset(seed=seed)
+        assert np.array_equal(obs, env._next_observation(out=full))
+        done = False
+        while not done:
+            # Out of range actions exercise the slot clipping too
+            obs, _, done, _ = env.step(int(rng.integers(-1, 5)))
+            assert np.array_equal(obs, env._next_observation(out=full))
+
+
+def test_observation_out():
+    env = BriscolaEnv()
+    out = np.zeros(env.obs_shape, dtype=np.int8)
+    obs = env.reset(seed=0, out=out)
+    assert obs is out and np.array_equal(out, env._obs)
+    obs, _, _, _ = env.step(0, out=out)
+    assert obs is out and np.array_equal(out, env._obs)
+
+
+@pytest.mark.parametrize('num_players', [2, 4])
+def test_vec_env_matches_env(num_players):
+    num_envs = 8
+    envs = [BriscolaEnv(num_players=num_players) for _ in range(num_envs)]
+    vec_env = BriscolaVecEnv(num_envs, num_players=num_players)
+    obs = np.array([env.reset(seed=seed) for seed, env in enumerate(envs)])
+    vec_env.game.deal([env.game.deck_order for env in envs])
+    assert np.array_equal(vec_env._output(), obs)
+    rng = np.random.default_rng(num_players)
+    for t in range(NUM_CARDS):
+        actions = rng.integers(-1, 5, size=num_envs)
+        steps = [env.step(int(action)) for env, action in zip(envs, actions)]
+        vec_obs, vec_rewards, vec_dones, info = vec_env.step(actions)
+        rewards = np.array([reward for _, reward, _, _ in steps])
+        obs = np.array([obs for obs, _, _, _ in steps])
+        assert np.array_equal(vec_rewards, rewards)
+        if t < NUM_CARDS - 1:
+            assert not vec_dones.any()
+            assert np.array_equal(vec_obs, obs)
+    # BriscolaEnv ends the game on the step following the last card
+    assert vec_dones.all()
+    assert np.array_equal(info['terminal_observation'], obs)
+    for env in envs:
+        _, reward, done, _ = env.step(0)
+        assert done and not reward.any()
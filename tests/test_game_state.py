@@ -0,0 +1,104 @@
+import pytest
+
+from briscola_gym.envs.briscola_cache import PositionCache
+from briscola_gym.envs.briscola_game import Game
+
+
+def positions(num_players, seed):
+    """Play a random game, yielding it after every card played and every
+    trick resolved."""
+    game = Game(num_players=num_players, seed=seed)
+    yield game
+    while game.players_hand_size() > 0:
+        for _ in range(num_players):
+            player_id = (game.last_winner_id + len(game.field.get_cards_and_ids())) % num_players
+            player = game.players[player_id]
+            game.player_play_card(player_id, game.rng.integers(player.hand.size))
+            yield game
+        game.resolve_step()
+        yield game
+
+
+@pytest.mark.parametrize('num_players', [2, 4])
+def test_restore_snapshot(num_players):
+    other = Game(num_players=num_players, seed=0)
+    for seed in range(20):
+        for game in positions(num_players, seed):
+            state = game.snapshot()
+            other.restore(state)
+            assert other.snapshot() == state
+            assert other.state_hash == game.state_hash
+            assert other.tricks == game.tricks
+            assert other.played_mask == game.played_mask
+
+
+@pytest.mark.parametrize('num_players', [2, 4])
+def test_clone_snapshot(num_players):
+    for seed in range(20):
+        for game in positions(num_players, seed):
+            clone = game.clone()
+            assert clone.snapshot() == game.snapshot()
+            assert clone.state_hash == game.state_hash
+
+
+def test_clone_is_independent():
+    game = Game(seed=0)
+    game.on_event = lambda event, data: None
+    state = game.snapshot()
+    clone = game.clone()
+    assert clone.on_event is None
+    clone.simulate_random_game(verbose=0)
+    assert game.snapshot() == state
+
+
+def assert_hash(game):
+    state_hash = game.state_hash
+    assert game._rehash() == state_hash
+
+
+@pytest.mark.parametrize('num_players', [2, 4])
+def test_incremental_hash(num_players):
+    for seed in range(20):
+        for game in positions(num_players, seed):
+            assert_hash(game)
+
+
+@pytest.mark.parametrize('num_players', [2, 4])
+def test_incremental_hash_random_steps(num_players):
+    game = Game(num_players=num_players, seed=0)
+    for _ in range(10):
+        assert_hash(game)
+        while game.players_hand_size() > 0:
+            game.random_step()
+            assert_hash(game)
+            game.resolve_step()
+            assert_hash(game)
+        deck_order = game.deck_order
+        game.reset()
+        game.init_game()
+        assert_hash(game)
+        game.replay(deck_order, [])
+        assert_hash(game)
+
+
+def test_hash_ignores_hand_order():
+    game = Game(seed=0)
+    other = game.clone()
+    other.players[0].hand._cards.reverse()
+    assert other._rehash() == game.state_hash
+    other.player_play_card(0, 0)
+    assert other.state_hash != game.state_hash
+
+
+def test_position_cache_lru():
+    cache = PositionCache(max_entries=2)
+    cache.put(1, 'a')
+    cache.put(2, 'b')
+    assert cache.get(1) == 'a'
+    cache.put(3, 'c')
+    assert 2 not in cache and 1 in cache and 3 in cache
+    assert cache.get(2) is None
+    assert cache.get_or_compute(4, lambda: 'd') == 'd'
+    assert cache.get_or_compute(4, lambda: 'e') == 'd'
+    assert cache.stats() == {'entries': 2, 'hits': 2, 'misses': 2, 'evictions': 2,
+                             'hit_rate': 0.5}
@@ -0,0 +1,31 @@
+import pytest
+
+from briscola_gym.envs.briscola_game import Game
+from briscola_gym.envs.briscola_mcts import ISMCTSPlayer
+
+
+def test_tight_budget_runs_one_iteration():
+    game = Game(seed=0)
+    for player in (ISMCTSPlayer(iterations=1, seed=0),
+                   ISMCTSPlayer(iterations=None, time_budget=1e-9, seed=0)):
+        assert player.search(game, 0) in game.players[0].hand.card_ids
+
+
+@pytest.mark.parametrize('kwargs', [{'iterations': 0}, {'iterations': -1},
+                                    {'time_budget': 0.}, {'time_budget': -1.}])
+def test_non_positive_budget(kwargs):
+    with pytest.raises(ValueError):
+        ISMCTSPlayer(**kwargs)
+
+
+def test_plays_full_games():
+    for num_players in (2, 4):
+        game = Game(num_players=num_players, seed=1)
+        player = ISMCTSPlayer(iterations=20, seed=1)
+        while game.players_hand_size() > 0:
+            for _ in range(num_players):
+                player_id = (game.last_winner_id +
+                             len(game.field.get_cards_and_ids())) % num_players
+                game.player_play_card(player_id, player(game, player_id))
+            game.resolve_step()
+        assert sum(game.teams_score.values()) == 120
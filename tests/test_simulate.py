@@ -0,0 +1,30 @@
+import numpy as np
+import pytest
+
+from briscola_gym.envs.briscola_game import NUM_CARDS, MAX_TEAM_POINTS
+from briscola_gym.envs.briscola_vec_game import iter_simulate_games, simulate_games
+
+
+@pytest.mark.parametrize('num_players', [2, 4])
+def test_shapes(num_players):
+    for n in (0, 1, 5):
+        results = simulate_games(n, num_players=num_players, seed=0, chunk_size=2)
+        assert results['teams_score'].shape == (n, 2)
+        assert results['trick_winners'].shape == (n, NUM_CARDS // num_players)
+        assert results['briscola_suit'].shape == (n,)
+        assert (results['teams_score'].sum(axis=1) == MAX_TEAM_POINTS).all()
+
+
+def test_seeded_policy_games_repeat():
+    policy = lambda game: np.zeros(game.num_games, dtype=np.int8)
+    first = simulate_games(3, policy=policy, seed=1)
+    second = simulate_games(3, policy=policy, seed=1)
+    for key in first:
+        assert np.array_equal(first[key], second[key])
+
+
+def test_invalid_policy():
+    with pytest.raises(ValueError):
+        iter_simulate_games(1, policy='greedy')
+    with pytest.raises(TypeError):
+        iter_simulate_games(1, policy=0)
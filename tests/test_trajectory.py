@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+
+from briscola_gym.envs.briscola_env import BriscolaEnv
+from briscola_gym.envs.briscola_game import Game, NUM_CARDS
+from briscola_gym.envs.briscola_trajectory import TrajectoryRecorder, TrajectoryReader
+
+
+@pytest.mark.parametrize('num_players', [2, 4])
+def test_round_trip(tmp_path, num_players):
+    path = str(tmp_path / 'games.bin')
+    rng = np.random.default_rng(num_players)
+    opponent = lambda game, seat: int(rng.integers(-1, 5))
+    env = TrajectoryRecorder(BriscolaEnv(num_players=num_players, opponent=opponent,
+                                         player_id=1), path, chunk_size=7)
+    scores = []
+    for seed in range(25):
+        env.reset(seed=seed)
+        done = False
+        while not done:
+            _, _, done, _ = env.step(int(rng.integers(-1, 5)))
+        scores.append([env.game.teams_score[0], env.game.teams_score[1]])
+    env.close()
+
+    reader = TrajectoryReader(path)
+    assert len(reader) == len(scores)
+    assert (reader[:]['num_actions'] == NUM_CARDS).all()
+    positions = reader.replay(np.arange(len(reader)))
+    assert np.array_equal(positions.teams_score, scores)
+    for i, record in enumerate(reader):
+        game = Game(num_players=num_players, init_game=False).replay(record['deck'],
+                                                                     record['actions'])
+        assert [game.teams_score[0], game.teams_score[1]] == scores[i]
+    rewards = np.concatenate([batch['reward'] for batch in reader.iter_batches(10)])
+    team_rewards = rewards.reshape(len(scores), NUM_CARDS, num_players)[:, :, :2].sum(axis=1)
+    assert np.array_equal(team_rewards, scores)
+
+
+def test_partial_game_appends(tmp_path):
+    path = str(tmp_path / 'games.bin')
+    env = TrajectoryRecorder(BriscolaEnv(), path)
+    env.reset(seed=0)
+    for _ in range(10):
+        env.step(0)
+    env.close()
+    reader = TrajectoryReader(path)
+    assert len(reader) == 1 and reader[0]['num_actions'] == 10
+    position = reader.replay([0])
+    game = Game(init_game=False).replay(reader[0]['deck'], reader[0]['actions'], upto=10)
+    assert position.teams_score.tolist() == [[game.teams_score[0], game.teams_score[1]]]
@@ -0,0 +1,133 @@
+import itertools
+
+import numpy as np
+import pytest
+
+from briscola_gym.envs.briscola_game import (
+    Card, Deck, Field, CARD_IDS, CARD_NAME, CARD_SCORE, CARD_SUIT, CARD_VALUE, NUM_CARDS,
+    TRICK_POINTS, TRICK_WINNER, seed_dict)
+from briscola_gym.envs.briscola_vec_game import VecGame, shuffle_decks
+
+
+class BaselineField(object):
+    """Field resolving tricks with the object-based rule the lookup tables
+    replaced: per-card briscola flags and score comparison."""
+    def __init__(self):
+        super(BaselineField, self).__init__()
+        self._cards = []
+
+    def add_card(self, card, player_id, team_id):
+        self._cards.append((card, player_id, team_id))
+
+    def get_current_winner(self):
+        winner_card, winner_player_id, winner_team_id = self._cards[0]
+        for card, player_id, team_id in self._cards[1:]:
+            if card.seed == winner_card.seed:
+                if card.score > winner_card.score:
+                    winner_card = card
+                    winner_player_id = player_id
+                    winner_team_id = team_id
+            elif card.is_briscola():
+                winner_card = card
+                winner_player_id = player_id
+                winner_team_id = team_id
+        return winner_player_id, winner_team_id
+
+    def get_score(self):
+        return sum(card.score for card, _, _ in self._cards)
+
+
+def baseline_card(card_id, briscola_suit):
+    return Card(CARD_NAME[card_id], seed_dict[CARD_SUIT[card_id]],
+                is_briscola=CARD_SUIT[card_id] == briscola_suit, card_id=card_id)
+
+
+def baseline_trick(card_ids, briscola_suit, num_teams=2):
+    field = BaselineField()
+    for player_id, card_id in enumerate(card_ids):
+        field.add_card(baseline_card(card_id, briscola_suit), player_id, player_id % num_teams)
+    return field
+
+
+def table_trick(card_ids, briscola_suit, num_teams=2):
+    field = Field(Deck(briscola=seed_dict[briscola_suit]))
+    for player_id, card_id in enumerate(card_ids):
+        field.add_card(card_id, player_id, player_id % num_teams)
+    return field
+
+
+def zero_point_ties():
+    """Pairs the tables intentionally resolve differently: two non-scoring
+    cards of the same suit, where the higher rank now beats the lead."""
+    return {(briscola_suit, lead, card)
+            for briscola_suit in range(len(seed_dict))
+            for lead, card in itertools.permutations(CARD_IDS, 2)
+            if CARD_SUIT[lead] == CARD_SUIT[card]
+            and CARD_SCORE[lead] == CARD_SCORE[card] == 0
+            and CARD_VALUE[card] > CARD_VALUE[lead]}
+
+
+def has_zero_point_tie(card_ids):
+    return any(CARD_SUIT[a] == CARD_SUIT[b] and CARD_SCORE[a] == CARD_SCORE[b] == 0
+               for a, b in itertools.combinations(card_ids, 2))
+
+
+def test_zero_point_ties_whitelist():
+    assert len(zero_point_ties()) == 160
+
+
+def test_trick_winner_matches_baseline_on_every_pair():
+    stride = NUM_CARDS + 1
+    mismatches = set()
+    for briscola_suit in range(len(seed_dict)):
+        for lead, card in itertools.permutations(CARD_IDS, 2):
+            field = baseline_trick((lead, card), briscola_suit)
+            beats = field.get_current_winner()[0] == 1
+            if bool(TRICK_WINNER[briscola_suit][lead * stride + card]) != beats:
+                mismatches.add((briscola_suit, lead, card))
+            assert TRICK_POINTS[lead * stride + card] == field.get_score()
+    assert mismatches == zero_point_ties()
+
+
+def test_no_briscola_plane():
+    stride = NUM_CARDS + 1
+    for lead, card in itertools.permutations(CARD_IDS, 2):
+        expected = CARD_SUIT[card] == CARD_SUIT[lead] and CARD_VALUE[card] > CARD_VALUE[lead]
+        assert bool(TRICK_WINNER[-1][lead * stride + card]) == expected
+
+
+@pytest.mark.parametrize('num_players', [2, 4])
+def test_field_matches_baseline_on_random_tricks(num_players):
+    rng = np.random.default_rng(num_players)
+    for _ in range(5000):
+        briscola_suit = int(rng.integers(len(seed_dict)))
+        card_ids = [int(card_id) for card_id in rng.choice(CARD_IDS, num_players, replace=False)]
+        field = table_trick(card_ids, briscola_suit)
+        if not has_zero_point_tie(card_ids):
+            assert field.get_current_winner() == \
+                baseline_trick(card_ids, briscola_suit).get_current_winner()
+        assert field.get_score() == sum(CARD_SCORE[card_id] for card_id in card_ids)
+
+
+@pytest.mark.parametrize('num_players', [2, 4])
+def test_vec_game_matches_field(num_players):
+    num_games = 2000
+    rng = np.random.default_rng(num_players)
+    game = VecGame(num_games, num_players=num_players, seed=rng)
+    game.deal(shuffle_decks(rng, num_games))
+    briscola_suit = game.briscola_suit.copy()
+    played = np.empty((num_games, num_players), dtype=np.int64)
+    for seat in range(num_players):
+        rewards, _ = game.step(game.random_actions())
+        played[:, seat] = game.last_card
+        if seat < num_players - 1:
+            partial = [table_trick(cards[:seat + 1], suit).get_current_winner()[0]
+                       for cards, suit in zip(played.tolist(), briscola_suit.tolist())]
+            assert np.array_equal(game.trick_winner(), partial)
+    for g, (cards, suit) in enumerate(zip(played.tolist(), briscola_suit.tolist())):
+        field = table_trick(cards, suit)
+        winner, team = field.get_current_winner()
+        assert game.trick_winners[g, 0] == winner
+        assert game.teams_score[g, team] == field.get_score()
+        assert game.teams_score[g, 1 - team] == 0
+        assert np.array_equal(rewards[g], np.where(game.seat_team == team, field.get_score(), 0))